@@ -0,0 +1,37 @@
+# Optional FFT/Numba backends and the cached FFTW plan, shared by the root PSD scripts.
+
+import functools
+import os
+
+# scipy.fft: pocketfft, multithreaded, keeps complex64; callers fall back to numpy.fft
+try:
+    import scipy.fft as sfft
+    HAVE_SCIPY = True
+except Exception:
+    sfft = None
+    HAVE_SCIPY = False
+
+# FFTW: planned SIMD FFT, preferred for fixed sizes
+try:
+    import pyfftw
+    HAVE_FFTW = True
+except Exception:
+    HAVE_FFTW = False
+
+# Numba for fused per-bin kernels; callers fall back to numpy
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except Exception:
+    njit = prange = None
+    HAVE_NUMBA = False
+
+@functools.lru_cache(maxsize=8)
+def fftw_plan(rows, nfft):
+    """(plan, in_buf, out_buf) for `rows` batched FFTs of `nfft`; buffers are reused per call."""
+    a = pyfftw.empty_aligned((rows, nfft), dtype="complex64")
+    b = pyfftw.empty_aligned((rows, nfft), dtype="complex64")
+    plan = pyfftw.FFTW(a, b, axes=(1,), direction="FFTW_FORWARD",
+                       flags=("FFTW_MEASURE","FFTW_DESTROY_INPUT"),
+                       threads=os.cpu_count() or 1)
+    return plan, a, b
@@ -0,0 +1,53 @@
+# Zero-copy SoapySDR RX through the C API, shared by the capture and duplex scripts.
+
+import ctypes
+import ctypes.util
+
+import numpy as np
+
+class DirectReader:
+    """Zero-copy RX: borrow the driver's DMA buffers via acquireReadBuffer/releaseReadBuffer.
+
+    The Python bindings only wrap readStream (which memcpys into our array), so this goes
+    through the SoapySDR C API with ctypes using the device/stream pointers SWIG holds.
+    """
+    def __init__(self, sdr, st):
+        lib = ctypes.CDLL(ctypes.util.find_library("SoapySDR") or "libSoapySDR.so")
+        self._acquire = lib.SoapySDRDevice_acquireReadBuffer
+        self._acquire.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(ctypes.c_size_t),
+                                  ctypes.POINTER(ctypes.c_void_p), ctypes.POINTER(ctypes.c_int),
+                                  ctypes.POINTER(ctypes.c_longlong), ctypes.c_long]
+        self._acquire.restype = ctypes.c_int
+        self._release = lib.SoapySDRDevice_releaseReadBuffer
+        self._release.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t]
+        self._release.restype = None
+        self._dev = ctypes.c_void_p(int(sdr.this))
+        self._st = ctypes.c_void_p(int(st))
+        self._handle = ctypes.c_size_t(0)
+        self._buffs = (ctypes.c_void_p * 1)()
+        self._flags = ctypes.c_int(0)
+        self._time_ns = ctypes.c_longlong(0)
+
+    @classmethod
+    def probe(cls, sdr, st):
+        """Return a DirectReader if the driver exposes direct-access buffers, else None."""
+        try:
+            if sdr.getNumDirectAccessBuffers(st) <= 0:
+                return None
+            return cls(sdr, st)
+        except Exception:
+            return None
+
+    def acquire(self, timeout_us):
+        """Acquire the next filled driver buffer; returns elements available or a negative error."""
+        return self._acquire(self._dev, self._st, ctypes.byref(self._handle), self._buffs,
+                             ctypes.byref(self._flags), ctypes.byref(self._time_ns), timeout_us)
+
+    def view(self, count, dtype):
+        """ndarray view (no copy) over the currently acquired buffer; only valid until release()."""
+        dtype = np.dtype(dtype)
+        raw = (ctypes.c_byte * (count * dtype.itemsize)).from_address(self._buffs[0])
+        return np.frombuffer(raw, dtype=dtype, count=count)
+
+    def release(self):
+        self._release(self._dev, self._st, self._handle.value)
@@ -1,15 +1,110 @@
 #!/usr/bin/env python3
-import argparse, json, time, os, sys
+import argparse, json, mmap, queue, threading, time, os, sys
 import numpy as np
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CF32, SOAPY_SDR_CS16
 
+from _soapy_direct import DirectReader
+
 def parse_gain(g):
     try:
         return float(g)
     except:
         return None
 
+class GatherWriter:
+    """Group-commit file writer: queues views of completed buffers and flushes them with one os.writev.
+
+    Views are held, not copied, so the caller must not refill a queued buffer before flush();
+    max_pending bounds the queue to the number of backing buffers the caller rotates through.
+    """
+    def __init__(self, path, flush_bytes=4 << 20, max_pending=4):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.flush_bytes = flush_bytes
+        self.max_pending = max(1, min(max_pending, os.sysconf("SC_IOV_MAX")))
+        self.pending = []
+        self.pending_bytes = 0
+
+    def write(self, buf):
+        mv = memoryview(buf).cast("B")
+        self.pending.append(mv)
+        self.pending_bytes += mv.nbytes
+        if self.pending_bytes >= self.flush_bytes or len(self.pending) >= self.max_pending:
+            self.flush()
+
+    def flush(self):
+        iov = self.pending
+        while iov:
+            n = os.writev(self.fd, iov)
+            # drop fully written views, trim a partially written one
+            while iov and n >= iov[0].nbytes:
+                n -= iov[0].nbytes
+                iov.pop(0)
+            if n:
+                iov[0] = iov[0][n:]
+        self.pending_bytes = 0
+
+    def close(self):
+        self.flush()
+        os.close(self.fd)
+
+class MmapWriter:
+    """Writes into a pre-sized, memory-mapped output file (MADV_SEQUENTIAL) for long captures.
+
+    Same interface as GatherWriter. Data is copied into the mapping immediately, so nothing
+    is ever left pending; the file grows if the estimate was short and is trimmed on close.
+    """
+    def __init__(self, path, size_bytes):
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.size = max(int(size_bytes), mmap.PAGESIZE)
+        os.ftruncate(self.fd, self.size)
+        self.mm = mmap.mmap(self.fd, self.size)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.mm.madvise(mmap.MADV_SEQUENTIAL)
+        self.off = 0
+        self.pending = []
+
+    def write(self, buf):
+        mv = memoryview(buf).cast("B")
+        end = self.off + mv.nbytes
+        if end > self.size:
+            self.size = max(end, self.size + self.size // 4)
+            os.ftruncate(self.fd, self.size)
+            self.mm.resize(self.size)
+        self.mm[self.off:end] = mv
+        self.off = end
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        os.ftruncate(self.fd, self.off)
+        os.close(self.fd)
+
+class SoaWriter:
+    """Splits interleaved I/Q into separate I and Q files (AoS -> SoA) as it writes.
+
+    The strided lanes aren't contiguous, so each gets one copy; the source buffer is
+    free again as soon as write() returns.
+    """
+    def __init__(self, i_path, q_path, **kw):
+        self.wi = GatherWriter(i_path, **kw)
+        self.wq = GatherWriter(q_path, **kw)
+        self.pending = []
+
+    def write(self, buf):
+        lanes = buf.view(np.float32) if buf.dtype == np.complex64 else buf
+        self.wi.write(lanes[0::2].copy())
+        self.wq.write(lanes[1::2].copy())
+
+    def flush(self):
+        self.wi.flush(); self.wq.flush()
+
+    def close(self):
+        self.wi.close(); self.wq.close()
+
 def main():
     ap = argparse.ArgumentParser(description="LimeSDR Mini IQ capture (SoapySDR) for Gqrx")
     ap.add_argument("--device", default="driver=lime", help='Soapy device string (default: "driver=lime")')
@@ -26,8 +121,20 @@ def main():
     ap.add_argument("--dc",   action="store_true", help="Enable DC offset correction")
     ap.add_argument("--iqbal",action="store_true", help="Enable IQ balance correction")
     ap.add_argument("--buflen", type=int, default=1<<18, help="Stream buffer length (samples per read)")
+    layout = ap.add_mutually_exclusive_group()
+    layout.add_argument("--mmap", action="store_true", help="Write through a pre-sized memory-mapped file (long captures)")
+    layout.add_argument("--soa",  action="store_true", help="Write I and Q to separate files (<out>.i.s16/.q.s16 or .f32)")
+    ap.add_argument("--cpu",  type=int, default=None, help="Pin the SDR read thread to this CPU (e.g. one near the USB controller)")
     args = ap.parse_args()
 
+    # per-stage gains are parsed before the device is opened, so bad input fails early
+    stages = {}
+    if "," in args.gain:
+        try:
+            stages = dict(zip(("LNA","TIA","PGA"), map(float, args.gain.split(","))))
+        except ValueError:
+            ap.error(f'--gain: expected numbers like "35,9,20", got {args.gain!r}')
+
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
 
     # make device
@@ -38,14 +145,12 @@ def main():
     sdr.setAntenna(SOAPY_SDR_RX, ch, args.ant)
 
     # gains
-    if "," in args.gain:
-        parts = args.gain.split(",")
-        names = ["LNA","TIA","PGA"]
-        for name, val in zip(names, parts):
+    if stages:
+        for name, val in stages.items():
             try:
-                sdr.setGainElement(SOAPY_SDR_RX, ch, name, float(val))
-            except Exception:
-                pass
+                sdr.setGainElement(SOAPY_SDR_RX, ch, name, val)
+            except Exception as e:
+                print(f"Warning: gain element {name} not set ({e})", file=sys.stderr)
     else:
         g = parse_gain(args.gain)
         if g is not None:
@@ -86,48 +191,156 @@ def main():
     st = sdr.setupStream(SOAPY_SDR_RX, fmt, [ch])
     sdr.activateStream(st)
 
-    # writer
-    fout = open(args.out, "wb", buffering=0)
+    # writer: completed reads are batched and flushed ~4 MiB at a time with one writev
+    flush_bytes = 4 << 20
 
     start = time.time()
     total_samps = 0
 
-    # helper to write buffer
+    # helper to write buffer (hands the ndarray's memory straight to the writer, no tobytes() copy)
     def write_buf(buf):
         nonlocal total_samps
+        fout.write(buf)
         if fmt == SOAPY_SDR_CF32:
-            # Soapy gives np.complex64 directly
-            fout.write(buf.astype(np.complex64).view(np.float32).tobytes())
+            # Soapy gives np.complex64 directly; bytes are already interleaved float32 I/Q
             total_samps += buf.size
         else:
-            # Soapy returns np.int16 interleaved as I and Q already
-            # Some drivers return shape (N,2) int16; normalize to 1-D interleaved
-            if buf.ndim == 2 and buf.shape[1] == 2:
-                inter = buf.reshape(-1)
-                fout.write(inter.tobytes())
-                total_samps += buf.shape[0]
-            else:
-                # Already interleaved 1-D int16 stream
-                fout.write(buf.tobytes())
-                total_samps += buf.size // 2
-
-    buf = np.empty(args.buflen, dtype=dtype)
+            # 1-D interleaved int16 I/Q, 2 words per complex sample
+            total_samps += buf.size // 2
 
-    try:
-        while (time.time() - start) < args.dur:
-            sr = sdr.readStream(st, [buf], args.buflen, timeoutUs=int(0.5e6))
-            if sr.ret > 0:
-                write_buf(buf[:sr.ret])
-            elif sr.ret == 0:
-                continue
-            else:
-                # negative => error code
-                print(f"readStream error: {sr.ret}", file=sys.stderr)
+    if fmt == SOAPY_SDR_CF32:
+        words = 1
+    else:
+        # numElems is in complex samples; CS16 needs 2 int16 words per sample, kept 1-D and contiguous
+        words = 2
+    # ring of read buffers: free_q holds empty ones, full_q carries (buf, n) to the writer thread.
+    # Half the ring can sit queued in a writev batch while the other half keeps filling.
+    buf_bytes = words * args.buflen * np.dtype(dtype).itemsize
+    batch = max(2, -(-flush_bytes // buf_bytes))
+    nbufs = 2 * batch
+    free_q = queue.Queue()
+    full_q = queue.Queue(maxsize=nbufs)
+    for _ in range(nbufs):
+        free_q.put(np.empty(words * args.buflen, dtype=dtype))
+    out_files = [args.out]
+    if args.soa:
+        base, ext = os.path.splitext(args.out)[0], ("f32" if fmt == SOAPY_SDR_CF32 else "s16")
+        out_files = [f"{base}.i.{ext}", f"{base}.q.{ext}"]
+        fout = SoaWriter(*out_files, flush_bytes=flush_bytes // 2)
+    elif args.mmap:
+        # projected size for the whole run plus one read of slack
+        fout = MmapWriter(args.out, (args.dur * args.rate + args.buflen) * words * np.dtype(dtype).itemsize)
+    else:
+        fout = GatherWriter(args.out, flush_bytes=flush_bytes, max_pending=batch)
+
+    write_err = []
+
+    def writer():
+        held = []  # buffers whose views are queued in fout, returned once the batch is flushed
+        while True:
+            item = full_q.get()
+            if item is None:
                 break
+            buf, n = item
+            if not write_err:
+                try:
+                    write_buf(buf[:words * n])
+                except OSError as e:
+                    # keep draining full_q and handing buffers back so capture() can stop cleanly
+                    write_err.append(e)
+                    fout.pending.clear()
+            held.append(buf)
+            if write_err or not fout.pending:
+                for b in held:
+                    free_q.put(b)
+                held.clear()
+        if not write_err:
+            try:
+                fout.flush()
+            except OSError as e:
+                write_err.append(e)
+
+    # prefer zero-copy driver buffers; fall back to readStream into buf
+    direct = DirectReader.probe(sdr, st)
+    if direct is not None:
+        print("Using direct buffer access (acquireReadBuffer)")
+
+    wthread = None
+    if direct is None:
+        wthread = threading.Thread(target=writer, name="iq-writer", daemon=True)
+        wthread.start()
+
+    stalls = 0     # reads that had to wait for the writer to hand back a buffer
+    errors = []
+    stop = threading.Event()
+
+    def capture():
+        nonlocal stalls
+        if args.cpu is not None:
+            os.sched_setaffinity(0, {args.cpu})
+        try:
+            while not stop.is_set() and not write_err and (time.time() - start) < args.dur:
+                if direct is not None:
+                    n = direct.acquire(int(0.5e6))
+                    if n >= 0:
+                        try:
+                            if n > 0:
+                                write_buf(direct.view(words * n, dtype))
+                                fout.flush()  # the driver buffer is only ours until release
+                        finally:
+                            direct.release()
+                else:
+                    try:
+                        buf = free_q.get_nowait()
+                    except queue.Empty:
+                        stalls += 1
+                        buf = None
+                        while buf is None and not stop.is_set() and not write_err:
+                            try:
+                                buf = free_q.get(timeout=0.5)
+                            except queue.Empty:
+                                pass
+                        if buf is None:
+                            break
+                    n = sdr.readStream(st, [buf], args.buflen, timeoutUs=int(0.5e6)).ret
+                    if n > 0:
+                        full_q.put((buf, n))
+                    else:
+                        free_q.put(buf)
+                if n < 0:
+                    # negative => error code
+                    print(f"readStream error: {n}", file=sys.stderr)
+                    break
+        except Exception as e:
+            errors.append(e)
+
+    # SDR reads run on their own thread so disk stalls in the writer never block the driver
+    cthread = threading.Thread(target=capture, name="iq-capture", daemon=True)
+
+    try:
+        cthread.start()
+        cthread.join()
     finally:
+        stop.set()
+        cthread.join(timeout=1.0)
         sdr.deactivateStream(st)
         sdr.closeStream(st)
-        fout.close()
+        if wthread is not None:
+            full_q.put(None)
+            wthread.join()
+        try:
+            fout.close()
+        except OSError as e:
+            if not write_err:
+                write_err.append(e)
+
+    if write_err:
+        print(f"write error: {write_err[0]}", file=sys.stderr)
+        sys.exit(1)
+    if errors:
+        raise errors[0]
+    if stalls:
+        print(f"Warning: writer fell behind {stalls} times (capture waited for a free buffer)", file=sys.stderr)
 
     if args.meta:
         meta = {
@@ -141,6 +354,7 @@ def main():
             "format": args.fmt,
             "samples_captured": int(total_samps),
             "file": os.path.abspath(args.out),
+            "soa_files": [os.path.abspath(f) for f in out_files] if args.soa else None,
             "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
             "agc": bool(args.agc),
             "dc_correction": bool(args.dc),
@@ -149,7 +363,7 @@ def main():
         with open(args.out + ".json", "w") as jf:
             json.dump(meta, jf, indent=2)
 
-    print(f"Done. Samples: {total_samps}  ->  {args.out}")
+    print(f"Done. Samples: {total_samps}  ->  {', '.join(out_files)}")
 
 if __name__ == "__main__":
     main()
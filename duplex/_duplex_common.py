@@ -0,0 +1,16 @@
+# Helpers shared by the duplex TX/RX scripts.
+
+from fractions import Fraction
+from typing import Tuple
+
+def tone_period(tone_hz: float, rate: float, lo: int = 4096, hi: int = 65536) -> Tuple[int, float]:
+    """Smallest length >= lo holding a whole number of tone cycles, so the buffer
+    tiles forever without phase jumps. Returns (n, tone_hz); if tone_hz/rate needs
+    a period longer than `hi` samples, the tone is moved to the nearest frequency
+    that repeats within `hi` (off by at most rate/(2*hi))."""
+    if rate <= 0:
+        return lo, float(tone_hz)
+    # cycles per sample as an exact ratio; its denominator is the period in samples
+    cps = (Fraction(tone_hz) / Fraction(rate)).limit_denominator(hi)
+    period = cps.denominator
+    return period * max(1, -(-lo // period)), float(cps * Fraction(rate))
@@ -9,8 +9,35 @@ import matplotlib.pyplot as plt
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_TX, SOAPY_SDR_CF32
 
-def read_stream_compat(sdr, st, view, want, timeout_us=1_000_000):
-    res = sdr.readStream(st, [view], want, timeoutUs=timeout_us)
+from _duplex_common import tone_period
+
+# Optional FFTW (planned, SIMD FFT); falls back to numpy.fft
+try:
+    import pyfftw
+    import pyfftw.builders
+    HAVE_FFTW = True
+except Exception:
+    HAVE_FFTW = False
+
+# Optional Numba for fused per-bin kernels; falls back to numpy
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
+# Optional pyqtgraph GUI (--gui qt)
+try:
+    import pyqtgraph as pg
+    from pyqtgraph.Qt import QtCore
+    HAVE_QTGRAPH = True
+except Exception:
+    HAVE_QTGRAPH = False
+
+# Both helpers take the Soapy buffer list itself (e.g. [buf]) so hot loops can pass
+# one preallocated list instead of building a new one per call.
+def read_stream_compat(sdr, st, bufs, want, timeout_us=1_000_000):
+    res = sdr.readStream(st, bufs, want, timeoutUs=timeout_us)
     if hasattr(res, "ret"): return int(res.ret), int(getattr(res,"flags",0))
     if isinstance(res,(tuple,list)):
         if not res: return 0,0
@@ -18,19 +45,42 @@ def read_stream_compat(sdr, st, view, want, timeout_us=1_000_000):
     try: return int(res),0
     except Exception: return 0,0
 
-def write_stream_compat(sdr, st, buf):
-    res = sdr.writeStream(st, [buf], len(buf))
+def write_stream_compat(sdr, st, bufs):
+    res = sdr.writeStream(st, bufs, len(bufs[0]))
     if hasattr(res, "ret"): return int(res.ret)
     if isinstance(res, (tuple, list)): return int(res[0]) if res else 0
     try: return int(res)
     except Exception: return 0
 
+# waterfall display range; rows are stored as uint8 levels across this span
+WF_DB_MIN, WF_DB_MAX = -100.0, -40.0
+WF_SCALE = 255.0 / (WF_DB_MAX - WF_DB_MIN)
+
 def hann(n): return np.hanning(n).astype(np.float32)
 
-def stft_frame(iq: np.ndarray, nfft: int, window: np.ndarray) -> np.ndarray:
-    X = np.fft.fftshift(np.fft.fft(iq * window, n=nfft))
-    pxx = (np.abs(X)**2) / (nfft + 1e-12)
-    return 10.0*np.log10(pxx + 1e-12).astype(np.float32)
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _mag2db(X, psd, add_const):
+        """fftshift + |X|^2 + 10*log10 in one pass: psd[k] = dB(X[k - n//2]) + add_const."""
+        n = X.shape[0]; s = n // 2
+        for k in prange(n):
+            j = k - s if k >= s else k + n - s
+            r = X[j].real; i = X[j].imag
+            psd[k] = 10.0*math.log10(r*r + i*i + 1e-20) + add_const
+
+    @njit(fastmath=True, cache=True)
+    def _tone(amp, dphi, out):
+        """out[k] = amp*exp(1j*k*dphi), one sincos per sample straight into complex64."""
+        for k in range(out.shape[0]):
+            ph = k*dphi
+            out[k] = complex(amp*math.cos(ph), amp*math.sin(ph))
+
+    @njit(fastmath=True, cache=True)
+    def _quantize_db(psd, row, lo, scale):
+        """row[k] = clip((psd[k]-lo)*scale, 0, 255) as uint8, one pass."""
+        for k in range(psd.shape[0]):
+            v = (psd[k] - lo) * scale
+            row[k] = 0 if v < 0.0 else (255 if v > 255.0 else np.uint8(v))
 
 def bins_for_range(center_hz: float, span_hz: float, nfft: int, fstart: float, fstop: float):
     bin_bw = span_hz / nfft
@@ -57,6 +107,20 @@ class TxWorker(threading.Thread):
         self.a = args
         self.stop_evt = stop_evt
         self.st = None
+        # tone is fixed for the run: synthesise it once, before the thread starts
+        self.wave = self.make_tone() if args.tx_mode == "tone" else None
+
+    def make_tone(self) -> np.ndarray:
+        a = self.a
+        n, tone_hz = tone_period(float(a.tone_hz), float(a.tx_rate), lo=2048)
+        if tone_hz != float(a.tone_hz):
+            print(f"[TX] tone adjusted to {tone_hz:.3f} Hz for a seamless {n}-sample loop")
+        dphi = 2*np.pi*tone_hz/float(a.tx_rate)
+        wave = np.empty(n, dtype=np.complex64)
+        if HAVE_NUMBA: _tone(float(a.amplitude), dphi, wave)
+        else: wave[:] = a.amplitude*np.exp(1j*dphi*np.arange(n))
+        wave.flags.writeable = False  # same buffer every writeStream; never re-synthesised
+        return wave
 
     def run(self):
         a = self.a
@@ -89,13 +153,10 @@ class TxWorker(threading.Thread):
 
         try:
             if a.tx_mode == "tone":
-                n = 4096
-                t = np.arange(n, dtype=np.float32) / float(a.tx_rate)
-                ph = 2*np.pi*float(a.tone_hz)*t
-                wave = (a.amplitude*(np.cos(ph)+1j*np.sin(ph))).astype(np.complex64)
+                wave_list = [self.wave]
                 t_end = time.time() + a.seconds if a.seconds>0 else None
                 while not self.stop_evt.is_set() and (t_end is None or time.time()<t_end):
-                    if write_stream_compat(self.sdr, self.st, wave) <= 0: continue
+                    if write_stream_compat(self.sdr, self.st, wave_list) <= 0: continue
             elif a.tx_mode == "file":
                 path = Path(a.iq).expanduser()
                 iq = np.fromfile(path, dtype=np.complex64)
@@ -103,19 +164,23 @@ class TxWorker(threading.Thread):
                 rms = np.sqrt(np.mean(np.abs(iq)**2))
                 if rms>0: iq = (iq*(a.amplitude/(4.0*rms))).astype(np.complex64)
                 idx, n = 0, 4096
+                # looping: append an n-sample ghost copy of the head so every chunk,
+                # including the wrap-around one, is a contiguous slice (no per-wrap concatenate)
+                if a.loop: iq_ring = np.concatenate([iq, np.resize(iq, n)])
+                chunk_list = [None]
                 t_end = time.time() + a.seconds if a.seconds>0 else None
                 while not self.stop_evt.is_set() and (t_end is None or time.time()<t_end):
-                    chunk = iq[idx:idx+n]
-                    if chunk.size < n:
-                        if not a.loop:
-                            if chunk.size>0: write_stream_compat(self.sdr, self.st, chunk)
-                            break
-                        need = n - chunk.size
-                        chunk = np.concatenate([chunk, iq[:need]])
-                        idx = need
+                    if a.loop:
+                        chunk = iq_ring[idx:idx+n]
+                        idx = (idx + n) % iq.size
                     else:
+                        chunk = iq[idx:idx+n]
                         idx += n
-                    if write_stream_compat(self.sdr, self.st, chunk) <= 0: continue
+                        if chunk.size < n:
+                            if chunk.size>0: write_stream_compat(self.sdr, self.st, [chunk])
+                            break
+                    chunk_list[0] = chunk
+                    if write_stream_compat(self.sdr, self.st, chunk_list) <= 0: continue
             else:
                 print("[TX] mode off; nothing transmitted.")
         finally:
@@ -161,12 +226,45 @@ class RxViewer:
         self.sdr.activateStream(self.st)
 
         self.buf = np.empty(self.nfft, dtype=np.complex64)
+        self._drain = np.empty(self.nfft, dtype=np.complex64)  # spare block for draining backlog
+        self._bufs, self._drain_bufs = [self.buf], [self._drain]
         self.win = hann(self.nfft)
+
+        # FFT plan + scratch buffers, built once and reused every frame
+        if HAVE_FFTW:
+            self._windowed = pyfftw.empty_aligned(self.nfft, dtype=np.complex64)
+            self._fft = pyfftw.builders.fft(self._windowed, n=self.nfft, overwrite_input=True,
+                                            avoid_copy=True, threads=2, planner_effort="FFTW_MEASURE")
+        else:
+            self._windowed = np.empty(self.nfft, dtype=np.complex64)
+            self._fft = lambda: np.fft.fft(self._windowed)
+        # real window applied to I and Q as float32 lanes, written straight into the FFT input
+        self._iq_view = self._windowed.view(np.float32).reshape(self.nfft, 2)
+        self._win_col = self.win[:, None]
+        self._X_shift = np.empty(self.nfft, dtype=np.complex64)
+        self._psd = np.empty(self.nfft, dtype=np.float32)
+        self._db_offset = -10.0*math.log10(self.nfft)  # folds the /nfft normalisation into dB
         self.alpha = float(args.avg)
         self.psd_avg = None
         self.wf_rows = int(args.wf_rows)
-        self.wf = np.full((self.wf_rows, self.nfft), -120.0, dtype=np.float32)
+        # waterfall ring stored twice (mirrored) so the time-ordered window
+        # self.wf[head:head+wf_rows] is always a contiguous view, never a copy;
+        # rows are uint8 levels over WF_DB_MIN..WF_DB_MAX (a quarter of float32 traffic)
+        self.wf = np.zeros((2*self.wf_rows, self.nfft), dtype=np.uint8)
+        self._wf_head = 0
+        self._wf_q = np.empty(self.nfft, dtype=np.float32)
+
+        self.markers = self.a.marker or []
+        self.mute_ranges = parse_mute_ranges(self.a.mute_range)
+        self.mute_bins = []
+        self.recompute_mute_bins()
+
+        self._setup_gui()
+        signal.signal(signal.SIGINT, self.sigint)
 
+    # --- matplotlib GUI (RxViewerQt overrides these) ---
+
+    def _setup_gui(self):
         self.fig, (self.ax_psd, self.ax_wf) = plt.subplots(
             2,1, figsize=(10,6), gridspec_kw=dict(height_ratios=[1,2])
         )
@@ -177,28 +275,87 @@ class RxViewer:
         self.ax_psd.set_ylabel("Power (dBFS)")
         self.update_title()
 
-        self.im = self.ax_wf.imshow(self.wf, aspect="auto", origin="lower",
-                                    vmin=-100, vmax=-40, interpolation="nearest")
+        self.im = self.ax_wf.imshow(self.wf_view(), aspect="auto", origin="lower",
+                                    vmin=0, vmax=255, interpolation="nearest")
         self.ax_wf.set_xlabel("FFT bin"); self.ax_wf.set_ylabel("Time")
 
         # markers
-        self.markers = self.a.marker or []
         self.marker_art = []
+        self.marker_wf_art = []
         for f in self.markers:
             bx = self.rf_to_bin(float(f))
             self.marker_art.append(self.ax_psd.axvline(bx, ls="--", lw=1, alpha=0.6))
-            self.ax_wf.axvline(bx, ls="--", lw=0.8, alpha=0.6)
-
-        self.mute_ranges = parse_mute_ranges(self.a.mute_range)
-        self.mute_bins = []
-        self.recompute_mute_bins()
+            self.marker_wf_art.append(self.ax_wf.axvline(bx, ls="--", lw=0.8, alpha=0.6))
 
         self.fig.canvas.mpl_connect("key_press_event", self.on_key)
-        signal.signal(signal.SIGINT, self.sigint)
+
+        # blitting: per frame only the PSD line and waterfall image are re-rendered over a
+        # cached background; any full draw (resize, retune, title change) refreshes the cache
+        self._animated = [self.psd_line, self.im] + self.marker_wf_art
+        for art in self._animated: art.set_animated(True)
+        self._bg = None
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def alive(self) -> bool:
+        return plt.fignum_exists(self.fig.number)
+
+    def close_gui(self):
+        plt.close("all")
+
+    def show_frame(self):
+        self.psd_line.set_ydata(self.psd_avg); self.im.set_data(self.wf_view())
+        self.redraw()
+
+    def refresh_overlays(self):
+        for ln, f in zip(self.marker_art, self.markers):
+            bx = self.rf_to_bin(float(f)); ln.set_xdata([bx,bx])
+        self.update_title()
+        self.fig.canvas.draw_idle()  # title/markers live in the blit background
 
     def update_title(self):
-        self.ax_psd.set_title(f"RX @ {self.center/1e6:.3f} MHz  fs={self.rate/1e6:.2f} Msps  "
-                              f"gain {self.a.gain:.1f} dB  avg {self.alpha:.2f}")
+        self.ax_psd.set_title(self.title_text())
+
+    def _on_draw(self, _ev=None):
+        c = self.fig.canvas
+        self._bg = (c.copy_from_bbox(self.ax_psd.bbox), c.copy_from_bbox(self.ax_wf.bbox))
+        self._draw_animated()
+
+    def _draw_animated(self):
+        self.ax_psd.draw_artist(self.psd_line)
+        self.ax_wf.draw_artist(self.im)
+        for ln in self.marker_wf_art: self.ax_wf.draw_artist(ln)
+
+    def redraw(self):
+        c = self.fig.canvas
+        if self._bg is None:
+            c.draw()
+        else:
+            for bg in self._bg: c.restore_region(bg)
+            self._draw_animated()
+            c.blit(self.ax_psd.bbox); c.blit(self.ax_wf.bbox)
+        c.flush_events()
+
+    def wf_view(self) -> np.ndarray:
+        """Waterfall rows oldest->newest (view into the mirrored ring)."""
+        return self.wf[self._wf_head:self._wf_head + self.wf_rows]
+
+    def push_wf_row(self, psd: np.ndarray):
+        h = self._wf_head
+        row = self.wf[h]
+        if HAVE_NUMBA:
+            _quantize_db(psd, row, WF_DB_MIN, WF_SCALE)
+        else:
+            q = self._wf_q
+            np.subtract(psd, WF_DB_MIN, out=q); q *= WF_SCALE
+            np.clip(q, 0.0, 255.0, out=q); row[:] = q
+        self.wf[h + self.wf_rows] = row
+        self._wf_head = (h + 1) % self.wf_rows
+
+    def title_text(self) -> str:
+        return (f"RX @ {self.center/1e6:.3f} MHz  fs={self.rate/1e6:.2f} Msps  "
+                f"gain {self.a.gain:.1f} dB  avg {self.alpha:.2f}")
 
     def rf_to_bin(self, f_hz: float) -> int:
         f0 = self.center - self.rate/2
@@ -211,6 +368,23 @@ class RxViewer:
             b0,b1 = bins_for_range(self.center, self.rate, self.nfft, f0, f1)
             self.mute_bins.append((b0,b1))
 
+    def stft_frame(self, iq: np.ndarray) -> np.ndarray:
+        """Windowed FFT -> dBFS into self._psd (overwritten next call)."""
+        nfft, h = self.nfft, self.nfft // 2
+        np.multiply(iq.view(np.float32).reshape(nfft, 2), self._win_col, out=self._iq_view)
+        X = self._fft()
+        if HAVE_NUMBA:
+            _mag2db(X, self._psd, self._db_offset)
+            return self._psd
+        # fftshift without allocating: rotate by nfft//2 into the scratch buffer
+        self._X_shift[:h] = X[nfft-h:]; self._X_shift[h:] = X[:nfft-h]
+        psd = self._psd
+        np.abs(self._X_shift, out=psd)
+        np.square(psd, out=psd)
+        psd *= 1.0 / (nfft + 1e-12); psd += 1e-12
+        np.log10(psd, out=psd); psd *= 10.0
+        return psd
+
     def apply_mutes(self, psd):
         if not self.mute_bins: return psd
         out = psd.copy()
@@ -220,51 +394,118 @@ class RxViewer:
         return out
 
     def on_key(self, ev):
+        self.handle_key(ev.key)
+
+    def handle_key(self, key):
         step = float(self.a.step_hz)
-        if ev.key == "left":
+        if key == "left":
             self.center -= step
-        elif ev.key == "right":
+        elif key == "right":
             self.center += step
-        elif ev.key == "up":
+        elif key == "up":
             self.a.gain = min(70.0, self.a.gain + 2.0)
             self.sdr.setGain(SOAPY_SDR_RX, self.ch, self.a.gain)
-        elif ev.key == "down":
+        elif key == "down":
             self.a.gain = max(0.0, self.a.gain - 2.0)
             self.sdr.setGain(SOAPY_SDR_RX, self.ch, self.a.gain)
-        elif ev.key in ("q","escape"):
+        elif key in ("q","escape"):
             self.sigint(); return
         else:
             return
         self.sdr.setFrequency(SOAPY_SDR_RX, self.ch, float(self.center))
         self.recompute_mute_bins()
-        for ln, f in zip(self.marker_art, self.markers):
-            bx = self.rf_to_bin(float(f)); ln.set_xdata([bx,bx])
-        self.update_title()
+        self.refresh_overlays()
 
     def sigint(self,*_):
         self.stop_evt.set()
-        plt.close("all")
+        self.close_gui()
         try: self.sdr.deactivateStream(self.st); self.sdr.closeStream(self.st)
         except Exception: pass
         sys.exit(0)
 
     def loop(self):
-        while plt.fignum_exists(self.fig.number) and not self.stop_evt.is_set():
-            nread,_ = read_stream_compat(self.sdr, self.st, self.buf, self.nfft)
+        while self.alive() and not self.stop_evt.is_set():
+            nread,_ = read_stream_compat(self.sdr, self.st, self._bufs, self.nfft)
             if nread <= 0: continue
+            # drain blocks already queued in the driver and keep only the newest full one:
+            # a slow GUI drops frames instead of back-pressuring the radio into overruns
+            while nread == self.nfft:
+                n2,_ = read_stream_compat(self.sdr, self.st, self._drain_bufs, self.nfft, timeout_us=0)
+                if n2 < self.nfft: break
+                self.buf, self._drain = self._drain, self.buf
+                self._bufs, self._drain_bufs = self._drain_bufs, self._bufs
             if nread < self.nfft:
                 tmp = np.zeros(self.nfft, dtype=np.complex64); tmp[:nread] = self.buf[:nread]
-                psd = stft_frame(tmp, self.nfft, self.win)
+                psd = self.stft_frame(tmp)
             else:
-                psd = stft_frame(self.buf, self.nfft, self.win)
+                psd = self.stft_frame(self.buf)
             psd = self.apply_mutes(psd)
-            if self.psd_avg is None: self.psd_avg = psd
+            if self.psd_avg is None: self.psd_avg = psd.copy()
             else: self.psd_avg = (1.0-self.alpha)*self.psd_avg + self.alpha*psd
-            self.wf = np.roll(self.wf, -1, axis=0); self.wf[-1,:] = psd
-            self.psd_line.set_ydata(self.psd_avg); self.im.set_data(self.wf)
-            plt.pause(0.001)
+            self.push_wf_row(psd)
+            self.show_frame()
         self.sigint()
 
+class RxViewerQt(RxViewer):
+    """RxViewer drawn with pyqtgraph: the waterfall is an ImageItem texture upload
+    instead of a matplotlib imshow re-rasterisation."""
+
+    def _setup_gui(self):
+        K = getattr(QtCore.Qt, "Key", QtCore.Qt)
+        self._qt_keys = {K.Key_Left: "left", K.Key_Right: "right", K.Key_Up: "up",
+                         K.Key_Down: "down", K.Key_Q: "q", K.Key_Escape: "escape"}
+        self._app = pg.mkQApp("LimeSDR TX+RX Live")
+        self.win_qt = pg.GraphicsLayoutWidget(title="LimeSDR TX+RX Live")
+        self.win_qt.resize(1000, 600)
+
+        self.plot_psd = self.win_qt.addPlot(row=0, col=0)
+        self.plot_psd.setYRange(-100, -40); self.plot_psd.setXRange(0, self.nfft-1)
+        self.plot_psd.setLabel("left", "Power (dBFS)")
+        self.psd_curve = self.plot_psd.plot(np.zeros(self.nfft, dtype=np.float32))
+        self.update_title()
+
+        self.plot_wf = self.win_qt.addPlot(row=1, col=0)
+        self.plot_wf.setLabel("bottom", "FFT bin"); self.plot_wf.setLabel("left", "Time")
+        self.wf_item = pg.ImageItem()
+        self.wf_item.setLookupTable(pg.colormap.get("viridis").getLookupTable())
+        self.plot_wf.addItem(self.wf_item)
+        self.win_qt.ci.layout.setRowStretchFactor(1, 2)
+
+        dash = pg.mkPen(style=getattr(QtCore.Qt, "PenStyle", QtCore.Qt).DashLine)
+        self.marker_art = []
+        for f in self.markers:
+            bx = self.rf_to_bin(float(f))
+            ln = pg.InfiniteLine(pos=bx, angle=90, pen=dash); self.plot_psd.addItem(ln)
+            self.marker_art.append(ln)
+            self.plot_wf.addItem(pg.InfiniteLine(pos=bx, angle=90, pen=dash))
+
+        self.win_qt.keyPressEvent = self._qt_key
+        self.win_qt.show()
+
+    def _qt_key(self, ev):
+        key = self._qt_keys.get(ev.key())
+        if key: self.handle_key(key)
+
+    def alive(self) -> bool:
+        return self.win_qt.isVisible()
+
+    def close_gui(self):
+        self.win_qt.close()
+
+    def show_frame(self):
+        self.psd_curve.setData(self.psd_avg)
+        # ImageItem indexes [x, y]: bins along x, time along y
+        self.wf_item.setImage(self.wf_view().T, autoLevels=False, levels=(0, 255))
+        self._app.processEvents()
+
+    def refresh_overlays(self):
+        for ln, f in zip(self.marker_art, self.markers):
+            ln.setValue(self.rf_to_bin(float(f)))
+        self.update_title()
+
+    def update_title(self):
+        self.plot_psd.setTitle(self.title_text())
+
 def parse_mute_ranges(vals: Optional[List[str]]):
     out=[]
     for v in vals or []:
@@ -309,6 +550,7 @@ def main():
     ap.add_argument("--step-hz", type=float, default=1e6)
     ap.add_argument("--mute-range", action="append", help="mute absolute RF FSTART:FSTOP (Hz), repeatable")
     ap.add_argument("--marker", action="append", type=float, help="vertical marker at RF Hz, repeatable")
+    ap.add_argument("--gui", choices=["mpl","qt"], default="mpl", help="viewer backend (qt needs pyqtgraph)")
 
     # misc
     ap.add_argument("--seconds", type=float, default=0.0, help="TX duration (0 = until Ctrl-C)")
@@ -328,7 +570,10 @@ def main():
     tx_thr.start()
 
     # start RX viewer (blocks until window closes)
-    viewer = RxViewer(sdr, rx_ch, args, stop_evt)
+    if args.gui == "qt" and not HAVE_QTGRAPH:
+        print("[RX] pyqtgraph not installed; using matplotlib viewer", file=sys.stderr)
+    viewer_cls = RxViewerQt if args.gui == "qt" and HAVE_QTGRAPH else RxViewer
+    viewer = viewer_cls(sdr, rx_ch, args, stop_evt)
     viewer.loop()
 
 if __name__ == "__main__":
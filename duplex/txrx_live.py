@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import argparse, math, signal, sys, time, threading
+import argparse, functools, math, os, signal, sys, time, threading
 from pathlib import Path
 from typing import List, Tuple, Optional
 
@@ -9,6 +9,34 @@ import matplotlib.pyplot as plt
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_TX, SOAPY_SDR_CF32
 
+from _duplex_common import tone_period
+
+_ROOT = str(Path(__file__).resolve().parent.parent)  # repo root, for _soapy_direct
+if _ROOT not in sys.path:
+    sys.path.append(_ROOT)
+from _soapy_direct import DirectReader
+
+# Optional FFTW (planned, SIMD FFT); falls back to numpy.fft
+try:
+    import pyfftw
+    HAVE_FFTW = True
+except Exception:
+    HAVE_FFTW = False
+
+# Optional scipy.fft (pocketfft, multithreaded, keeps complex64); falls back to numpy.fft
+try:
+    import scipy.fft as sfft
+    HAVE_SCIPY = True
+except Exception:
+    HAVE_SCIPY = False
+
+# Optional Numba for fused per-bin kernels; falls back to numpy
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
 # ------------------- helpers -------------------
 
 def read_stream_compat(sdr, st, view, want, timeout_us=1_000_000):
@@ -91,10 +119,77 @@ def close_streams(*triples):
 
 def hann(n): return np.hanning(n).astype(np.float32)
 
-def stft_frame(iq: np.ndarray, nfft: int, window: np.ndarray) -> np.ndarray:
-    X = np.fft.fftshift(np.fft.fft(iq * window, n=nfft))
+def page_aligned(shape, dtype, align: int = 4096) -> np.ndarray:
+    """Uninitialised array starting on a page boundary, so USB drivers can DMA
+    straight to/from it instead of through a bounce buffer."""
+    if HAVE_FFTW:
+        return pyfftw.empty_aligned(shape, dtype=dtype, n=align)
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    off = (-raw.ctypes.data) % align
+    return raw[off:off+nbytes].view(dtype).reshape(shape)
+
+@functools.lru_cache(maxsize=8)
+def shifted_hann(n):
+    """Hann window with a (-1)^k modulation folded in: for even n the FFT of the
+    windowed block comes out already fftshifted, so frames need no shift copy.
+    Cached per size and shared, hence read-only."""
+    w = hann(n)
+    if n % 2 == 0: w[1::2] *= -1.0
+    w.flags.writeable = False
+    return w
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _psd_db(Xre, Xim, out, norm):
+        """out[i] = 10*log10(|X[i]|^2 * norm + 1e-12) in a single pass, no temporaries."""
+        for i in prange(out.shape[0]):
+            s = Xre[i]*Xre[i] + Xim[i]*Xim[i]
+            out[i] = 10.0*math.log10(s*norm + 1e-12)
+
+    @njit(fastmath=True, cache=True)
+    def _ema(avg, x, alpha):
+        """avg = (1-alpha)*avg + alpha*x, in place."""
+        beta = 1.0 - alpha
+        for i in range(avg.shape[0]):
+            avg[i] = beta*avg[i] + alpha*x[i]
+
+    @njit(cache=True)
+    def _apply_mutes(psd, ranges, floor):
+        """psd[b0:b1] = floor for every (b0, b1) row of the int32 ranges table."""
+        for i in range(ranges.shape[0]):
+            for k in range(ranges[i,0], ranges[i,1]):
+                psd[k] = floor
+
+def stft_frame(iq: np.ndarray, nfft: int, window: np.ndarray, plan=None, out=None,
+               fft_in=None) -> np.ndarray:
+    """PSD (dBFS) of one block, or of a (K, nfft) batch row by row. `window` comes from
+    shifted_hann(); `plan` is an optional pyfftw.FFTW over arrays shaped like `iq`, reused
+    across frames; `out` an optional float32 buffer the result is written into; `fft_in`
+    an optional complex64 scratch shaped like `iq` that takes the windowed block when
+    there is no plan, instead of a fresh temporary per frame."""
+    if plan is not None:
+        np.multiply(iq, window, out=plan.input_array)
+        X = plan()
+    else:
+        xw = iq * window if fft_in is None else np.multiply(iq, window, out=fft_in)
+        # xw is a temporary or our scratch, so the FFT may overwrite it
+        if HAVE_SCIPY:
+            X = sfft.fft(xw, n=nfft, axis=-1, overwrite_x=True, workers=-1)
+        else:
+            X = np.fft.fft(xw, n=nfft, axis=-1)
+    if nfft % 2: X = np.fft.fftshift(X, axes=-1)
+    if HAVE_NUMBA and out is not None:
+        # X.real/X.imag of a C-contiguous complex array flatten to strided views, no copy
+        _psd_db(X.real.reshape(-1), X.imag.reshape(-1), out.reshape(-1), 1.0/(nfft + 1e-12))
+        return out
     pxx = (np.abs(X)**2) / (nfft + 1e-12)
-    return 10.0*np.log10(pxx + 1e-12).astype(np.float32)
+    if out is None:
+        return 10.0*np.log10(pxx + 1e-12).astype(np.float32)
+    pxx += 1e-12
+    np.log10(pxx, out=out); out *= 10.0
+    return out
 
 def bins_for_range(center_hz: float, span_hz: float, nfft: int, fstart: float, fstop: float):
     bin_bw = span_hz / nfft
@@ -126,10 +221,12 @@ class TxWorker(threading.Thread):
 
         try:
             if a.tx_mode == "tone":
-                n = 4096
-                t = np.arange(n, dtype=np.float32) / float(a.tx_rate)
-                ph = 2*np.pi*float(a.tone_hz)*t
-                wave = (a.amplitude*(np.cos(ph)+1j*np.sin(ph))).astype(np.complex64)
+                n, tone_hz = tone_period(float(a.tone_hz), float(a.tx_rate))
+                if tone_hz != float(a.tone_hz):
+                    print(f"[TX] tone adjusted to {tone_hz:.3f} Hz for a seamless {n}-sample loop")
+                # built once; the same page-aligned buffer goes to every writeStream
+                wave = page_aligned(n, np.complex64)
+                wave[:] = a.amplitude*np.exp(2j*np.pi*tone_hz*np.arange(n)/float(a.tx_rate))
 
                 t_end = time.time() + a.seconds if a.seconds>0 else None
                 while not self.stop_evt.is_set() and (t_end is None or time.time()<t_end):
@@ -141,21 +238,24 @@ class TxWorker(threading.Thread):
                 iq = np.fromfile(path, dtype=np.complex64)
                 if iq.size == 0:
                     print("[TX] empty file"); return
-                rms = np.sqrt(np.mean(np.abs(iq)**2))
-                if rms>0: iq = (iq*(a.amplitude/(4.0*rms))).astype(np.complex64)
+                # single BLAS pass (scnrm2), scaled in place: no file-sized temporaries
+                rms = float(np.linalg.norm(iq)) / math.sqrt(iq.size)
+                if rms>0: iq *= np.float32(a.amplitude/(4.0*rms))
                 idx, n = 0, 4096
+                # looping: append an n-sample ghost copy of the head so every chunk,
+                # including the wrap-around one, is a contiguous slice (no per-wrap copy)
+                if a.loop: iq_ring = np.concatenate([iq, np.resize(iq, n)])
                 t_end = time.time() + a.seconds if a.seconds>0 else None
                 while not self.stop_evt.is_set() and (t_end is None or time.time()<t_end):
-                    chunk = iq[idx:idx+n]
-                    if chunk.size < n:
-                        if not a.loop:
-                            if chunk.size>0: write_stream_compat(sdr, st, chunk)
-                            break
-                        need = n - chunk.size
-                        chunk = np.concatenate([chunk, iq[:need]])
-                        idx = need
+                    if a.loop:
+                        chunk = iq_ring[idx:idx+n]
+                        idx = (idx + n) % iq.size
                     else:
+                        chunk = iq[idx:idx+n]
                         idx += n
+                        if chunk.size < n:
+                            if chunk.size>0: write_stream_compat(sdr, st, chunk)
+                            break
                     if write_stream_compat(sdr, st, chunk) <= 0:
                         continue
             else:
@@ -174,6 +274,12 @@ class RxViewer:
         self.rate   = float(args.rate)
         self.bw     = float(args.bw if args.bw is not None else self.rate)
         self.nfft   = int(args.fft)
+        if HAVE_SCIPY:
+            # sizes with large prime factors take pocketfft/FFTW's slow paths
+            n = sfft.next_fast_len(self.nfft, real=False)
+            if n != self.nfft:
+                print(f"[RX] fft size {self.nfft} -> {n} (next fast length)")
+                self.nfft = n
 
         self.sdr, self.st, self.ch = open_rx(
             center=self.center, rate=self.rate, bw=self.bw, gain=args.gain,
@@ -181,12 +287,41 @@ class RxViewer:
             pga=args.pga, antenna=args.rx_antenna
         )
 
-        self.buf = np.empty(self.nfft, dtype=np.complex64)
-        self.win = hann(self.nfft)
+        # K frames per readStream call. A reader thread fills slots of an SPSC ring of
+        # such batches (head: next slot to fill) and loop() drains them (tail: next to
+        # process), so plotting never stalls the radio. Only the reader advances head
+        # and only loop() advances tail.
+        self.batch = max(1, int(args.batch))
+        self.ring_len = max(2, int(args.ring))
+        self._ring = page_aligned((self.ring_len, self.batch, self.nfft), np.complex64)
+        self._ring_n = np.zeros(self.ring_len, dtype=np.int64)
+        self._rx_scratch = page_aligned(self.batch*self.nfft, np.complex64)
+        self._head = 0
+        self._tail = 0
+        self.rx_drops = 0
+        self._rx_ready = threading.Event()
+        self._reader = threading.Thread(target=self.reader, daemon=True)
+        # drivers with direct-access buffers are read straight out of their DMA ring
+        self._direct = DirectReader.probe(self.sdr, self.st)
+        self.win = shifted_hann(self.nfft)
+        self._psd_buf = np.empty((self.batch, self.nfft), dtype=np.float32)
+        self._ema_tmp = np.empty(self.nfft, dtype=np.float32)
+        # windowed (K, nfft) batch lands here; FFTW plans over it, one transform per row
+        self._fft_in = page_aligned((self.batch, self.nfft), np.complex64)
+        self._fft = None
+        if HAVE_FFTW:
+            self._fft_out = pyfftw.empty_aligned((self.batch, self.nfft), dtype="complex64")
+            self._fft = pyfftw.FFTW(self._fft_in, self._fft_out, axes=(1,), direction="FFTW_FORWARD",
+                                    flags=("FFTW_MEASURE","FFTW_DESTROY_INPUT"),
+                                    threads=os.cpu_count() or 1)
         self.alpha = float(args.avg)
         self.psd_avg = None
         self.wf_rows = int(args.wf_rows)
+        # circular waterfall: row _wf_head is the next to overwrite (i.e. the oldest)
         self.wf = np.full((self.wf_rows, self.nfft), -120.0, dtype=np.float32)
+        self._wf_head = 0
+        self.wf_every = max(1, int(args.wf_every))
+        self._frame = 0
 
         self.fig, (self.ax_psd, self.ax_wf) = plt.subplots(
             2,1, figsize=(10,6), gridspec_kw=dict(height_ratios=[1,2])
@@ -205,41 +340,82 @@ class RxViewer:
 
         # markers
         self.markers = self.a.marker or []
+        self._marker_freqs = np.asarray(self.markers, dtype=np.float64)
+        self._update_marker_bins()
         self.marker_art = []
-        for f in self.markers:
-            bx = self.rf_to_bin(float(f))
+        self.marker_wf_art = []
+        for bx in self._marker_bins:
             self.marker_art.append(self.ax_psd.axvline(bx, ls="--", lw=1, alpha=0.6))
-            self.ax_wf.axvline(bx, ls="--", lw=0.8, alpha=0.6)
+            self.marker_wf_art.append(self.ax_wf.axvline(bx, ls="--", lw=0.8, alpha=0.6))
 
         self.mute_ranges = parse_mute_ranges(self.a.mute_range)
-        self.mute_bins = []
+        self._mute_floor = None
+        self._mute_n = 0
         self.recompute_mute_bins()
 
         self.fig.canvas.mpl_connect("key_press_event", self.on_key)
         signal.signal(signal.SIGINT, self.sigint)
 
+        # blitting: per frame only the PSD line (and every wf_every frames the waterfall) is
+        # re-rendered over a cached background; any full draw refreshes the cache
+        for art in [self.psd_line, self.im] + self.marker_wf_art: art.set_animated(True)
+        self._bg = None
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, _ev=None):
+        c = self.fig.canvas
+        self._bg = (c.copy_from_bbox(self.ax_psd.bbox), c.copy_from_bbox(self.ax_wf.bbox))
+        self.ax_psd.draw_artist(self.psd_line)
+        self._draw_wf()
+
+    def _draw_wf(self):
+        self.ax_wf.draw_artist(self.im)
+        for ln in self.marker_wf_art: self.ax_wf.draw_artist(ln)
+
+    def redraw(self, wf=True):
+        c = self.fig.canvas
+        if self._bg is None:
+            c.draw()
+        else:
+            c.restore_region(self._bg[0])
+            self.ax_psd.draw_artist(self.psd_line)
+            c.blit(self.ax_psd.bbox)
+            if wf:
+                c.restore_region(self._bg[1])
+                self._draw_wf()
+                c.blit(self.ax_wf.bbox)
+        c.flush_events()
+
     def update_title(self):
         self.ax_psd.set_title(f"RX @ {self.center/1e6:.3f} MHz  fs={self.rate/1e6:.2f} Msps  "
                               f"gain {self.a.gain:.1f} dB  avg {self.alpha:.2f}")
 
-    def rf_to_bin(self, f_hz: float) -> int:
+    def _update_marker_bins(self):
+        # all markers in one vectorized pass; only changes when the center does
         f0 = self.center - self.rate/2
-        k = int(np.round((f_hz - f0)/(self.rate/self.nfft)))
-        return max(0, min(self.nfft-1, k))
+        self._marker_bins = np.clip(np.round((self._marker_freqs - f0)*self.nfft/self.rate),
+                                    0, self.nfft-1).astype(np.int32)
 
     def recompute_mute_bins(self):
-        self.mute_bins.clear()
-        for f0, f1 in self.mute_ranges:
-            b0, b1 = bins_for_range(self.center, self.rate, self.nfft, f0, f1)
-            self.mute_bins.append((b0,b1))
-
-    def apply_mutes(self, psd):
-        if not self.mute_bins: return psd
-        out = psd.copy()
-        floor = np.percentile(psd, 5)
-        for b0,b1 in self.mute_bins:
-            out[b0:b1] = floor
-        return out
+        # (K, 2) int32 table of [b0, b1) bin ranges for the njit kernel
+        bins = [bins_for_range(self.center, self.rate, self.nfft, f0, f1) for f0, f1 in self.mute_ranges]
+        self.mute_bins = np.array(bins, dtype=np.int32).reshape(-1, 2)
+
+    def apply_mutes_inplace(self, psd):
+        """Overwrite the muted bins of psd with the noise floor, in place."""
+        if not len(self.mute_bins): return
+        # the floor drifts slowly: refresh it every 30 frames with an O(n) select, not a sort
+        if self._mute_floor is None or self._mute_n % 30 == 0:
+            k = psd.size // 20
+            self._mute_floor = float(np.partition(psd, k)[k])
+        self._mute_n += 1
+        if HAVE_NUMBA:
+            _apply_mutes(psd, self.mute_bins, np.float32(self._mute_floor))
+        else:
+            for b0,b1 in self.mute_bins:
+                psd[b0:b1] = self._mute_floor
 
     def on_key(self, ev):
         step = float(self.a.step_hz)
@@ -260,31 +436,89 @@ class RxViewer:
             return
         self.sdr.setFrequency(SOAPY_SDR_RX, self.ch, float(self.center))
         self.recompute_mute_bins()
-        for ln, f in zip(self.marker_art, self.markers):
-            ln.set_xdata([self.rf_to_bin(float(f)), self.rf_to_bin(float(f))])
+        self._update_marker_bins()
+        for ln, lw, bx in zip(self.marker_art, self.marker_wf_art, self._marker_bins):
+            ln.set_xdata([bx, bx]); lw.set_xdata([bx, bx])
         self.update_title()
+        self.fig.canvas.draw_idle()  # title/markers live in the blit background
 
     def sigint(self,*_):
         self.stop_evt.set()
+        if self._reader.is_alive(): self._reader.join(timeout=2.0)
+        if self.rx_drops: print(f"[RX] {self.rx_drops} blocks dropped (viewer behind)")
         plt.close("all")
         close_streams((self.sdr,self.st,self.ch))
         sys.exit(0)
 
-    def loop(self):
-        while plt.fignum_exists(self.fig.number) and not self.stop_evt.is_set():
-            nread,_ = read_stream_compat(self.sdr, self.st, self.buf, self.nfft)
+    def read_batch(self, flat):
+        """Fill a flat K*nfft block; returns samples written. With direct access each driver
+        buffer is copied once, straight from DMA memory, and released immediately."""
+        if self._direct is None:
+            nread,_ = read_stream_compat(self.sdr, self.st, flat, flat.size)
+            return nread
+        got = 0
+        while got < flat.size:
+            n = self._direct.acquire(1_000_000)
+            if n <= 0: break
+            try:
+                # the unused tail of the last driver buffer is dropped; frames in a batch stay contiguous
+                take = min(n, flat.size - got)
+                flat[got:got+take] = self._direct.view(take, np.complex64)
+            finally:
+                self._direct.release()
+            got += take
+        return got
+
+    def reader(self):
+        while not self.stop_evt.is_set():
+            if self._head - self._tail >= self.ring_len:
+                # full: keep draining the radio into scratch and drop the block, rather
+                # than block on the viewer or write into slots loop() may be reading
+                self.read_batch(self._rx_scratch)
+                self.rx_drops += 1
+                continue
+            slot = self._head % self.ring_len
+            nread = self.read_batch(self._ring[slot].reshape(-1))
             if nread <= 0: continue
-            if nread < self.nfft:
-                tmp = np.zeros(self.nfft, dtype=np.complex64); tmp[:nread]=self.buf[:nread]
-                psd = stft_frame(tmp, self.nfft, self.win)
+            self._ring_n[slot] = nread
+            self._head += 1  # publish only after the slot is filled
+            self._rx_ready.set()
+
+    def process_batch(self, batch, nread):
+        rows = -(-nread // self.nfft)
+        if nread % self.nfft:
+            batch.reshape(-1)[nread:rows*self.nfft] = 0  # zero-pad the short last frame
+        psds = stft_frame(batch, self.nfft, self.win, self._fft, self._psd_buf, self._fft_in)
+        for psd in psds[:rows]:
+            self.apply_mutes_inplace(psd)
+            if self.psd_avg is None: self.psd_avg = psd.copy()
+            elif HAVE_NUMBA: _ema(self.psd_avg, psd, self.alpha)
             else:
-                psd = stft_frame(self.buf, self.nfft, self.win)
-            psd = self.apply_mutes(psd)
-            if self.psd_avg is None: self.psd_avg = psd
-            else: self.psd_avg = (1.0-self.alpha)*self.psd_avg + self.alpha*psd
-            self.wf = np.roll(self.wf, -1, axis=0); self.wf[-1,:] = psd
-            self.psd_line.set_ydata(self.psd_avg); self.im.set_data(self.wf)
-            plt.pause(0.001)
+                # in place: no per-frame temporaries beyond the preallocated scratch
+                self.psd_avg *= (1.0-self.alpha)
+                np.multiply(psd, self.alpha, out=self._ema_tmp); self.psd_avg += self._ema_tmp
+            self.wf[self._wf_head, :] = psd
+            self._wf_head = (self._wf_head + 1) % self.wf_rows
+
+    def loop(self):
+        self._reader.start()
+        while plt.fignum_exists(self.fig.number) and not self.stop_evt.is_set():
+            if self._tail == self._head:
+                self._rx_ready.wait(0.05); self._rx_ready.clear()
+                self.fig.canvas.flush_events()  # keep the GUI responsive while idle
+                continue
+            # drain everything queued, then draw once: redraw rate is decoupled from read rate
+            while self._tail < self._head:
+                slot = self._tail % self.ring_len
+                self.process_batch(self._ring[slot], int(self._ring_n[slot]))
+                self._tail += 1
+            self.psd_line.set_ydata(self.psd_avg)
+            # unroll the ring into time order only when the image is actually refreshed
+            wf_due = self._frame % self.wf_every == 0
+            if wf_due:
+                self.im.set_data(np.concatenate((self.wf[self._wf_head:], self.wf[:self._wf_head]), axis=0))
+            self._frame += 1
+            self.redraw(wf_due)
         self.sigint()
 
 # ------------------- CLI -------------------
@@ -324,6 +558,9 @@ def main():
     # Plot & control
     ap.add_argument("--fft", type=int, default=4096)
     ap.add_argument("--wf-rows", type=int, default=240)
+    ap.add_argument("--batch", type=int, default=8, help="FFT frames per RX read")
+    ap.add_argument("--ring", type=int, default=8, help="RX reads buffered between reader thread and viewer")
+    ap.add_argument("--wf-every", type=int, default=4, help="refresh the waterfall image every N frames")
     ap.add_argument("--avg", type=float, default=0.6)
     ap.add_argument("--step-hz", type=float, default=1e6)
     ap.add_argument("--mute-range", action="append", help="mute absolute RF FSTART:FSTOP (Hz), repeatable")
@@ -1,21 +1,52 @@
 import subprocess
 import re
 
+# Optional pyroute2: nl80211 scan over netlink, no iwlist subprocess or text parsing
+try:
+    from pyroute2 import IW
+    HAVE_PYROUTE2 = True
+except Exception:
+    HAVE_PYROUTE2 = False
+
+CELL_RE = re.compile(r"Signal level=(-?\d+) dBm(?:(?!Cell ).)*?ESSID:\"([^\"]*)\"", re.DOTALL)
+
+def scan_nl80211(interface):
+    # Structured scan results straight from the kernel's BSS table
+    networks = []
+    iw = IW()
+    try:
+        idx = iw.get_interfaces_dict()[interface][0]
+        for msg in iw.scan(idx):
+            bss = msg.get_attr("NL80211_ATTR_BSS")
+            if bss is None:
+                continue
+            ies = bss.get_attr("NL80211_BSS_INFORMATION_ELEMENTS") or {}
+            ssid = ies.get("SSID")
+            mbm = bss.get_attr("NL80211_BSS_SIGNAL_MBM")
+            if ssid is None or mbm is None:
+                continue
+            if isinstance(ssid, bytes):
+                ssid = ssid.decode("utf-8", "replace")
+            networks.append({"SSID": ssid, "Signal": str(int(mbm / 100))})
+    finally:
+        iw.close()
+    return networks
+
+def scan_iwlist(interface):
+    # Run iwlist to scan Wi-Fi networks
+    result = subprocess.run(["iwlist", interface, "scanning"], capture_output=True, text=True)
+    output = result.stdout
+
+    # Parse SSIDs and signal strengths: one regex pass over the whole output.
+    # iwlist prints "Signal level" before "ESSID" within a cell, so match in that order
+    # and never across a "Cell " boundary.
+    pairs = CELL_RE.findall(output)
+    return [{"SSID": ssid, "Signal": sig} for sig, ssid in pairs]
+
 def scan_wifi(interface="wlan0"):
     try:
-        # Run iwlist to scan Wi-Fi networks
-        result = subprocess.run(["iwlist", interface, "scanning"], capture_output=True, text=True)
-        output = result.stdout
-
-        # Parse SSIDs and signal strengths
-        networks = []
-        cells = output.split("Cell ")[1:]  # Split by cell
-        for cell in cells:
-            ssid = re.search(r"ESSID:\"(.*?)\"", cell)
-            signal = re.search(r"Signal level=(-?\d+) dBm", cell)
-            if ssid and signal:
-                networks.append({"SSID": ssid.group(1), "Signal": signal.group(1)})
-        
+        networks = scan_nl80211(interface) if HAVE_PYROUTE2 else scan_iwlist(interface)
+
         # Print results
         if networks:
             print("Detected Wi-Fi Networks:")
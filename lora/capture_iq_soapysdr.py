@@ -1,9 +1,27 @@
 #!/usr/bin/env python3
-import argparse, json, time, os, sys
+import argparse, json, queue, threading, time, os, sys
 import numpy as np
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CF32, SOAPY_SDR_CS16
 
+# Optional Numba for the CS16 -> CF32 scaling kernel; falls back to numpy
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def cs16_to_cf32(cs16, out):
+        """Interleaved int16 I/Q -> complex64 with full scale at 1.0, one pass."""
+        c = np.float32(1.0/32768.0)
+        for i in prange(cs16.size // 2):
+            out[i] = complex(cs16[2*i]*c, cs16[2*i+1]*c)
+else:
+    def cs16_to_cf32(cs16, out):
+        np.multiply(cs16, np.float32(1.0/32768.0), out=out.view(np.float32)[:cs16.size])
+
 def parse_gain(g):
     try:
         return float(g)
@@ -25,13 +43,15 @@ def main():
     ap.add_argument("--agc",  action="store_true", help="Enable AGC (off by default)")
     ap.add_argument("--dc",   action="store_true", help="Enable DC offset correction")
     ap.add_argument("--iqbal",action="store_true", help="Enable IQ balance correction")
+    ap.add_argument("--scale", action="store_true", help="With --fmt cs16: stream CS16 but write CF32 scaled to ±1.0")
     ap.add_argument("--buflen", type=int, default=1<<16, help="Stream numElems per read (complex samples)")
     args = ap.parse_args()
 
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
 
     # open output before SDR (so a crash won’t leave 0-byte file uncreated)
-    fout = open(args.out, "wb", buffering=0)
+    # raw fd: buffers go to the kernel straight from the numpy arrays, no bytes copies
+    fd = os.open(args.out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
 
     # make device
     sdr = SoapySDR.Device(args.device)
@@ -71,41 +91,80 @@ def main():
     except Exception: pass
 
     # choose stream format
+    fmt = SOAPY_SDR_CF32 if args.fmt == "cf32" else SOAPY_SDR_CS16
+    st = sdr.setupStream(SOAPY_SDR_RX, fmt, [ch])
+    # whole driver transfers per read: round buflen up to a multiple of the stream MTU
+    try:
+        mtu = int(sdr.getStreamMTU(st))
+    except Exception:
+        mtu = 0
+    if mtu > 0 and args.buflen % mtu:
+        args.buflen = -(-args.buflen // mtu) * mtu
+        print(f"buflen rounded up to {args.buflen} (stream MTU {mtu})")
+
     if args.fmt == "cf32":
-        fmt = SOAPY_SDR_CF32
         dtype = np.complex64
         # numElems = complex samples; buffer shape must be [numElems] complex64
-        buf = np.empty(args.buflen, dtype=dtype)
+        bufs = [np.empty(args.buflen, dtype=dtype) for _ in range(2)]
     else:
-        fmt = SOAPY_SDR_CS16
         dtype = np.int16
         # numElems = complex samples; each complex sample = 2x int16
         # allocate 2*buflen int16 to hold I/Q interleaved
-        buf = np.empty(args.buflen * 2, dtype=dtype)
+        bufs = [np.empty(args.buflen * 2, dtype=dtype) for _ in range(2)]
+
+    # --scale: the driver still delivers CS16 (half the bus bandwidth), converted to CF32 on write
+    scale = args.scale and fmt == SOAPY_SDR_CS16
+    out_fmt = "cf32" if scale else args.fmt
+    outs = [np.empty(args.buflen, dtype=np.complex64) for _ in bufs] if scale else bufs
+    bytes_per_sample = 8 if out_fmt == "cf32" else 4
+
+    # double buffering: readStream fills one buffer while the writer thread drains the other.
+    # Write-behind latency is at most one buffer (buflen samples) between read and disk.
+    free_q, full_q = queue.Queue(), queue.Queue()
+    for i in range(len(bufs)): free_q.put(i)
+    # byte views made once per buffer; the writer only slices them
+    views = [memoryview(b).cast("B") for b in outs]
+    write_err = []
+
+    def writer():
+        while True:
+            item = full_q.get()
+            if item is None: return
+            i, count = item
+            try:
+                if scale: cs16_to_cf32(bufs[i][:2*count], outs[i])
+                mv = views[i][:count * bytes_per_sample]
+                while mv:
+                    mv = mv[os.writev(fd, [mv]):]
+            except OSError as e:
+                write_err.append(e)
+                return
+            finally:
+                free_q.put(i)
+
+    wt = threading.Thread(target=writer, daemon=True)
+    wt.start()
 
-    st = sdr.setupStream(SOAPY_SDR_RX, fmt, [ch])
     sdr.activateStream(st)
 
     start = time.time()
     total_complex = 0  # count complex samples written
 
     try:
-        while (time.time() - start) < args.dur:
+        while (time.time() - start) < args.dur and not write_err:
+            i = free_q.get()
+            buf = bufs[i]
             # numElems arg is in COMPLEX SAMPLES
             sr = sdr.readStream(st, [buf], args.buflen, timeoutUs=int(0.5e6))
             if sr.ret > 0:
-                if fmt == SOAPY_SDR_CF32:
-                    # view complex64 as float32 interleaved I/Q
-                    fout.write(buf[:sr.ret].view(np.float32).tobytes())
-                    total_complex += sr.ret
-                else:
-                    # CS16: driver gave interleaved int16 I/Q in a 1-D array of length 2*ret
-                    count = sr.ret * 2
-                    fout.write(buf[:count].tobytes())
-                    total_complex += sr.ret
+                # CF32: ret complex64 values; CS16: driver gave interleaved int16 I/Q, 2*ret values
+                full_q.put((i, sr.ret))
+                total_complex += sr.ret
             elif sr.ret == 0:
+                free_q.put(i)
                 continue
             else:
+                free_q.put(i)
                 print(f"readStream error: {sr.ret}", file=sys.stderr)
                 break
     finally:
@@ -113,8 +172,12 @@ def main():
             sdr.deactivateStream(st)
             sdr.closeStream(st)
         finally:
-            fout.flush()
-            fout.close()
+            full_q.put(None)
+            wt.join()
+            os.close(fd)
+    if write_err:
+        print(f"write error: {write_err[0]}", file=sys.stderr)
+        sys.exit(1)
 
     if args.meta:
         meta = {
@@ -125,7 +188,7 @@ def main():
             "antenna": args.ant,
             "gain": args.gain,
             "duration_s": args.dur,
-            "format": args.fmt,
+            "format": out_fmt,
             "num_complex_samples": int(total_complex),
             "file": os.path.abspath(args.out),
             "timestamp_utc": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
@@ -19,15 +19,39 @@ Author: you + fren
 import argparse
 import json
 import os
+import queue
 import sys
+import threading
 import time
-from collections import deque
 from datetime import datetime, timezone
 
 import numpy as np
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CS16
 
+from _soapy_direct import DirectReader
+
+# Optional orjson for sidecars (faster indented encode); falls back to json
+try:
+    import orjson
+    HAVE_ORJSON = True
+except Exception:
+    HAVE_ORJSON = False
+
+# Optional scipy.fft (multithreaded pocketfft) for the narrowband trigger; falls back to numpy.fft
+try:
+    import scipy.fft as sfft
+    HAVE_SCIPY = True
+except Exception:
+    HAVE_SCIPY = False
+
+# Optional Numba: single-pass energy + trigger kernel; falls back to numpy
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
 # ---------- Helpers ----------
 
 def utc_stamp():
@@ -37,26 +61,98 @@ def db10(x):
     return 10.0 * np.log10(np.maximum(x, 1e-30))
 
 def moving_percentile(x, p):
-    # Robust percentile for noise floor estimation
-    return np.percentile(x, p)
+    # Robust percentile for noise floor estimation: O(N) selection of the nearest rank, no sort
+    k = min(len(x) - 1, int(round(p / 100.0 * (len(x) - 1))))
+    return float(np.partition(x, k)[k])
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
 
+def close_capture(fh):
+    """Close a finished capture and drop its pages from the page cache: captures are
+    rarely re-read right away, and cached IQ only crowds out everything else."""
+    fh.flush()
+    if hasattr(os, "posix_fadvise"):
+        try:
+            # Linux starts writeback for dirty pages and evicts the clean ones
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+    fh.close()
+
+def write_json(path, obj):
+    if HAVE_ORJSON:
+        with open(path, "wb") as jf:
+            jf.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w") as jf:
+            json.dump(obj, jf, indent=2)
+
+if HAVE_NUMBA:
+    @njit(fastmath=True, cache=True, boundscheck=False)
+    def compute_energy_and_trigger(iq, w, h, recent, state, noise_pct, thr_gain):
+        """
+        One pass over interleaved int16 IQ: rolling int64 window sum of i*i+q*q, RMS
+        (raw counts) every h samples, pushed into the circular `recent` array
+        (state = [next index, count]). Returns (rms, noise_floor, thr, triggered);
+        noise_floor/thr are -1 until `recent` has filled once.
+        """
+        n = iq.size // 2
+        if n < w:
+            return np.empty(0, dtype=np.float32), -1.0, -1.0, False
+        nwin = (n - w) // h + 1
+        rms = np.empty(nwin, dtype=np.float32)
+        scale = 1.0 / w  # RMS computed in raw-count units; thresholding is scale-invariant
+        s = np.int64(0)
+        for k in range(w):
+            a = np.int64(iq[2*k]); b = np.int64(iq[2*k+1])
+            s += a*a + b*b
+        rms[0] = np.sqrt(s * scale)
+        emax = rms[0]
+        for j in range(1, nwin):
+            start = j * h
+            if h >= w:
+                s = 0
+                for k in range(start, start + w):
+                    a = np.int64(iq[2*k]); b = np.int64(iq[2*k+1])
+                    s += a*a + b*b
+            else:
+                for k in range(start - h, start):
+                    a = np.int64(iq[2*k]); b = np.int64(iq[2*k+1])
+                    s -= a*a + b*b
+                for k in range(start - h + w, start + w):
+                    a = np.int64(iq[2*k]); b = np.int64(iq[2*k+1])
+                    s += a*a + b*b
+            rms[j] = np.sqrt(s * scale)
+            emax = max(emax, rms[j])
+
+        cap = recent.size
+        for j in range(nwin):
+            recent[state[0]] = rms[j]
+            state[0] = (state[0] + 1) % cap
+        state[1] = min(cap, state[1] + nwin)
+        if state[1] < cap:
+            return rms, -1.0, -1.0, False
+        k = min(cap - 1, int(round(noise_pct / 100.0 * (cap - 1))))
+        floor = np.partition(recent, k)[k]
+        thr = floor * thr_gain
+        return rms, floor, thr, emax > thr
+
 def parse_gain_string(s):
     """
     Accept either a single numeric gain in dB, or per-stage "LNA,TIA,PGA".
-    Returns a dict {mode: 'overall'|'per', overall:float, elems:{LNA,TIA,PGA}}.
+    Returns a dict {mode: 'overall'|'per', overall:float, elems:{LNA,TIA,PGA}, text:s}.
+    Used as the argparse type of --gain, so it runs once, at parse time.
     """
     if "," in s:
         parts = s.split(",")
-        out = {"mode":"per","elems":{}}
+        out = {"mode":"per","elems":{},"text":s}
         names = ["LNA","TIA","PGA"]
         for name,val in zip(names,parts):
             out["elems"][name] = float(val)
         return out
     else:
-        return {"mode":"overall","overall":float(s)}
+        return {"mode":"overall","overall":float(s),"text":s}
 
 # ---------- Core Scanner ----------
 
@@ -69,7 +165,7 @@ class SoapyLimeScanner:
         # Configure RF front-end
         self.sdr.setAntenna(SOAPY_SDR_RX, self.ch, args.antenna)
         # Gain
-        g = parse_gain_string(args.gain)
+        g = args.gain
         if g["mode"] == "overall":
             self.sdr.setGain(SOAPY_SDR_RX, self.ch, g["overall"])
         else:
@@ -96,19 +192,45 @@ class SoapyLimeScanner:
         self.stream = self.sdr.setupStream(SOAPY_SDR_RX, SOAPY_SDR_CS16, [self.ch])
         self.buflen = args.buflen
         self.buf = np.empty(self.buflen*2, dtype=np.int16)  # I,Q interleaved
+        # Zero-copy reads straight from the driver's DMA buffers when it exposes them
+        self.direct = DirectReader.probe(self.sdr, self.stream)
+        lanes = self.buflen
+        if self.direct is not None:
+            # direct chunks are whole driver buffers (the MTU), not buflen
+            try: lanes = max(lanes, int(self.sdr.getStreamMTU(self.stream)))
+            except Exception: pass
+        # contiguous int32 I/Q lanes for the numpy energy path, reused every chunk
+        self._ii = np.empty(lanes, dtype=np.int32)
+        self._qq = np.empty(lanes, dtype=np.int32)
         self.active = False
 
-        # Pre/post buffers in raw int16 IQ (interleaved)
-        self.pre_int16 = deque(maxlen=int(args.pre_seconds * args.rate * 2))
+        # Pre/post buffers in raw int16 IQ (interleaved). The pre-roll is a fixed ring:
+        # pre_head is the next write position, pre_full once it has wrapped.
+        self.pre_capacity = int(args.pre_seconds * args.rate) * 2
+        self.pre_buf = np.empty(self.pre_capacity, dtype=np.int16)
+        self.pre_head = 0
+        self.pre_full = False
         self.post_hold_samples = int(args.post_seconds * args.rate)  # complex samples
         self.max_capture_samples = int(args.max_capture_s * args.rate)  # complex samples
 
         # Energy estimation buffers
         self.win_samps = max(256, int(args.energy_window_s * args.rate))  # samples per RMS window
         self.hop_samps = max(128, int(args.energy_hop_s    * args.rate))
-        self.recent_energies = deque(maxlen=args.noise_est_windows)
+        # Narrowband trigger: FFT bins either side of DC inside +-trigger_bw/2
+        self.band_bins = int(args.trigger_bw / 2 * self.win_samps / args.rate) if args.trigger_bw > 0 else None
+        # recent RMS windows for the noise floor: circular float32 array + [next index, count]
+        self.recent_buf = np.zeros(args.noise_est_windows, dtype=np.float32)
+        self.recent_state = np.zeros(2, dtype=np.int64)
+        self.thr_gain = 10**(args.trigger_db_over_floor/20.0)
         self.last_trigger_time = 0.0
 
+        # Disk writes happen on a writer thread so a slow write never stalls readStream.
+        # Items are (fh, int16 array) to write, (fh, None) to close, or None to exit;
+        # bounded so a stalled disk can't grow memory without limit.
+        self.write_q = queue.Queue(maxsize=8)
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+
         ensure_dir(args.outdir)
 
     def set_freq(self, freq_hz):
@@ -131,14 +253,49 @@ class SoapyLimeScanner:
             self.deactivate()
         finally:
             self.sdr.closeStream(self.stream)
+            self.write_q.put(None)
+            self._writer.join()
+
+    # --- Pre-roll ring ---
+
+    def _pre_push(self, chunk):
+        cap = self.pre_capacity
+        if cap == 0:
+            return
+        if chunk.size >= cap:
+            self.pre_buf[:] = chunk[-cap:]
+            self.pre_head, self.pre_full = 0, True
+            return
+        end = self.pre_head + chunk.size
+        if end <= cap:
+            self.pre_buf[self.pre_head:end] = chunk
+        else:
+            k = cap - self.pre_head
+            self.pre_buf[self.pre_head:] = chunk[:k]
+            self.pre_buf[:end-cap] = chunk[k:]
+        if end >= cap:
+            self.pre_full = True
+        self.pre_head = end % cap
+
+    def _pre_clear(self):
+        self.pre_head, self.pre_full = 0, False
+
+    def _pre_parts(self):
+        """Pre-roll contents oldest-first as (up to) two views into the ring, no copies."""
+        if not self.pre_full:
+            return (self.pre_buf[:self.pre_head],)
+        return (self.pre_buf[self.pre_head:], self.pre_buf[:self.pre_head])
 
     # --- Energy / trigger logic on raw CS16 buffer ---
 
     def _iter_frames(self):
-        """Yield successive chunks of interleaved int16 IQ with timestamps (host time)."""
+        """Yield successive chunks of interleaved int16 IQ with timestamps (host monotonic clock)."""
+        if self.direct is not None:
+            yield from self._iter_direct_frames()
+            return
         while True:
             sr = self.sdr.readStream(self.stream, [self.buf], self.buflen, timeoutUs=int(500e3))
-            t = time.time()
+            t = time.monotonic()
             if sr.ret > 0:
                 yield t, self.buf[:sr.ret*2]  # int16 interleaved (I,Q)
             elif sr.ret == 0:
@@ -148,47 +305,112 @@ class SoapyLimeScanner:
                 print(f"[readStream] error: {sr.ret}", file=sys.stderr)
                 return
 
+    def _iter_direct_frames(self):
+        """As _iter_frames, but each chunk is a view of a driver buffer: valid only until
+        the consumer asks for the next one, when it is released back to the driver."""
+        d = self.direct
+        while True:
+            n = d.acquire(int(500e3))
+            t = time.monotonic()
+            if n > 0:
+                try:
+                    yield t, d.view(n*2, np.int16)  # int16 interleaved (I,Q)
+                finally:
+                    d.release()
+            elif n == 0:
+                continue
+            else:
+                print(f"[acquireReadBuffer] error: {n}", file=sys.stderr)
+                return
+
     def _cs16_to_rms(self, iq_int16):
         """
         Compute RMS over a sliding window on interleaved int16 IQ.
-        Returns a list of window energies (float) and last tail for overlap handling.
+        Returns a float32 array of window RMS values in raw int16 counts.
         """
-        # Convert to float in [-1, 1)
-        iq = iq_int16.astype(np.float32).view(np.float32)
-        # "view(np.float32)" doesn't convert; we need to interleave to complex quickly:
-        # reshape to (N,2) then to complex
-        iq_pairs = iq_int16.reshape(-1,2).astype(np.float32)
-        iq_pairs /= 32768.0
-        i = iq_pairs[:,0]
-        q = iq_pairs[:,1]
-        x = i*i + q*q  # instantaneous power per sample
+        # Instantaneous power per sample, in integers: each square fits int32 and their
+        # sum (<= 2**31) fits uint32, so no float conversion of the raw stream
+        # SoA: deinterleave once into contiguous I and Q lanes so the rest is stride-1
+        n = iq_int16.size // 2
+        ii, qq = self._ii[:n], self._qq[:n]
+        np.copyto(ii, iq_int16[0::2]); np.copyto(qq, iq_int16[1::2])
+        ii *= ii; qq *= qq
+        x = ii.view(np.uint32); x += qq.view(np.uint32)
 
         w = self.win_samps
         h = self.hop_samps
         if len(x) < w:
             return np.empty(0, dtype=np.float32)
 
-        out = []
-        for start in range(0, len(x)-w+1, h):
-            seg = x[start:start+w]
-            out.append(np.sqrt(np.mean(seg)))
-        return np.array(out, dtype=np.float32)
+        # running sum: each window sum is a difference of two prefix sums, O(N) total
+        # instead of O(N*w/h). RMS computed in raw-count units; thresholding is scale-invariant.
+        cs = np.concatenate(([0], np.cumsum(x, dtype=np.int64)))
+        sums = cs[w::h] - cs[:len(cs)-w:h]
+        return np.sqrt(sums.astype(np.float32) * np.float32(1.0/w))
+
+    def _cs16_band_rms(self, iq_int16):
+        """
+        Like _cs16_to_rms, but only the power within +-trigger_bw/2 of the tuned center:
+        one FFT per window, summing the in-band bins. A 125 kHz LoRa burst in a 5 MS/s
+        capture then competes with ~1/40 of the wideband noise.
+        """
+        w = self.win_samps
+        h = self.hop_samps
+        x = iq_int16.astype(np.float32).view(np.complex64)
+        if len(x) < w:
+            return np.empty(0, dtype=np.float32)
+        segs = np.lib.stride_tricks.sliding_window_view(x, w)[::h]
+        if HAVE_SCIPY:
+            X = sfft.fft(segs, axis=1, workers=-1)
+        else:
+            X = np.fft.fft(segs, axis=1)
+        b = self.band_bins
+        lo, hi = X[:, :b+1], X[:, w-b:]  # DC..+bw/2, -bw/2..DC (empty when b == 0)
+        p = (lo.real**2 + lo.imag**2).sum(axis=1) + (hi.real**2 + hi.imag**2).sum(axis=1)
+        # Parseval: in-band mean power = sum|X_k|^2 / w^2 (raw-count units, like _cs16_to_rms)
+        return np.sqrt(p * (1.0 / (w * w))).astype(np.float32)
 
     def _update_noise_floor(self, energies):
         if energies.size == 0:
             return None, None
-        # store recent windows for robust floor
-        self.recent_energies.extend(energies.tolist())
-        if len(self.recent_energies) < self.recent_energies.maxlen:
+        # store recent windows for robust floor (slice copies into the ring)
+        cap = self.recent_buf.size
+        e = energies[-cap:]
+        idx = int(self.recent_state[0])
+        end = idx + e.size
+        if end <= cap:
+            self.recent_buf[idx:end] = e
+        else:
+            k = cap - idx
+            self.recent_buf[idx:] = e[:k]
+            self.recent_buf[:end-cap] = e[k:]
+        self.recent_state[0] = end % cap
+        self.recent_state[1] = min(cap, self.recent_state[1] + energies.size)
+        if self.recent_state[1] < cap:
             return None, None
-        noise_floor = moving_percentile(self.recent_energies, self.args.noise_percentile)
+        noise_floor = moving_percentile(self.recent_buf, self.args.noise_percentile)
         thr = noise_floor * (10**(self.args.trigger_db_over_floor/20.0))
         return noise_floor, thr
 
     # --- Recording ---
 
     def _write_cs16(self, fh, chunk):
-        fh.write(chunk.tobytes())
+        # the ndarray's buffer goes to the file as-is; tobytes() would copy it first
+        fh.write(chunk)
+
+    def _writer_loop(self):
+        while True:
+            item = self.write_q.get()
+            if item is None:
+                return
+            fh, data = item
+            try:
+                if data is None:
+                    close_capture(fh)
+                else:
+                    self._write_cs16(fh, data)
+            except (OSError, ValueError) as e:
+                print(f"[writer] {e}", file=sys.stderr)
 
     def run_channel(self, freq_hz, dwell_s):
         """
@@ -199,12 +421,13 @@ class SoapyLimeScanner:
         self.set_freq(freq_hz)
         self.activate()
 
-        st = time.time()
+        # monotonic: immune to NTP steps mid-dwell
+        deadline = time.monotonic() + dwell_s
         captures = 0
 
         # clear buffers/energy history for this channel
-        self.pre_int16.clear()
-        self.recent_energies.clear()
+        self._pre_clear()
+        self.recent_state[:] = 0
 
         # recording state
         recording = False
@@ -215,18 +438,22 @@ class SoapyLimeScanner:
 
         for host_ts, chunk in self._iter_frames():
             # maintain prebuffer (interleaved int16)
-            self.pre_int16.extend(chunk.tolist())
-
-            # energy windows
-            energies = self._cs16_to_rms(chunk)
-            noise_floor, thr = self._update_noise_floor(energies)
+            self._pre_push(chunk)
 
-            # evaluate trigger only once noise floor known
-            trig_now = False
-            if noise_floor is not None:
-                # if any window exceeds threshold => trigger
-                if energies.size and np.any(energies > thr):
-                    trig_now = True
+            # energy windows + trigger (evaluated only once noise floor known)
+            if HAVE_NUMBA and self.band_bins is None:
+                energies, noise_floor, thr, trig_now = compute_energy_and_trigger(
+                    chunk, self.win_samps, self.hop_samps, self.recent_buf, self.recent_state,
+                    self.args.noise_percentile, self.thr_gain)
+            else:
+                if self.band_bins is not None:
+                    energies = self._cs16_band_rms(chunk)
+                else:
+                    energies = self._cs16_to_rms(chunk)
+                noise_floor, thr = self._update_noise_floor(energies)
+                # if any window exceeds threshold => trigger; one max, then a scalar compare
+                emax = float(energies.max()) if energies.size else -np.inf
+                trig_now = noise_floor is not None and emax > thr
 
             # start recording
             if trig_now and not recording:
@@ -237,15 +464,15 @@ class SoapyLimeScanner:
                 out_iq = os.path.join(self.args.outdir, base + ".cs16")
                 out_js = out_iq + ".json"
 
-                fh = open(out_iq, "wb", buffering=0)
-                # Write prebuffer (truncate to full I/Q pairs)
-                pre_arr = np.frombuffer(np.array(self.pre_int16, dtype=np.int16).tobytes(), dtype=np.int16)
-                pre_arr = pre_arr[: (len(pre_arr)//2)*2]
-                if pre_arr.size:
-                    self._write_cs16(fh, pre_arr)
-                    wrote_samples = pre_arr.size // 2
-                else:
-                    wrote_samples = 0
+                # 1 MiB userspace buffer: pre-roll parts and small reads coalesce into fewer syscalls
+                fh = open(out_iq, "wb", buffering=1<<20)
+                # Write prebuffer straight from the ring (chunks and capacity are whole I/Q pairs)
+                wrote_samples = 0
+                for part in self._pre_parts():
+                    if part.size:
+                        # copy: the ring is refilled while the writer catches up
+                        self.write_q.put((fh, part.copy()))
+                        wrote_samples += part.size // 2
 
                 meta = {
                     "device": self.args.device,
@@ -253,7 +480,7 @@ class SoapyLimeScanner:
                     "rate_sps": float(self.args.rate),
                     "bandwidth_hz": float(self.args.bandwidth),
                     "antenna": self.args.antenna,
-                    "gain": self.args.gain,
+                    "gain": self.args.gain["text"],
                     "format": "cs16",
                     "timestamp_utc": stamp,
                     "pre_seconds": float(self.args.pre_seconds),
@@ -271,16 +498,17 @@ class SoapyLimeScanner:
                 post_left = self.post_hold_samples
                 recording = True
                 # Reset prebuffer so next capture starts fresh
-                self.pre_int16.clear()
+                self._pre_clear()
 
             # continue recording
             if recording:
                 # write current chunk
-                fh.write(chunk.tobytes())
+                # copy: the read buffer is reused (or released to the driver) next iteration
+                self.write_q.put((fh, chunk.copy()))
                 wrote_samples += chunk.size // 2
 
                 # update hold time: if energies are above threshold, reset hold
-                if noise_floor is not None and energies.size and np.any(energies > thr):
+                if trig_now:
                     post_left = self.post_hold_samples
                 else:
                     # decrease post-left by complex samples present in this chunk
@@ -288,12 +516,11 @@ class SoapyLimeScanner:
 
                 # stop conditions
                 if post_left <= 0 or wrote_samples >= self.max_capture_samples:
-                    fh.close()
+                    self.write_q.put((fh, None))  # writer flushes and closes
                     # write sidecar with counts
                     meta["samples_captured_complex"] = int(wrote_samples)
                     meta["duration_s_est"] = wrote_samples / float(self.args.rate)
-                    with open(out_js, "w") as jf:
-                        json.dump(meta, jf, indent=2)
+                    write_json(out_js, meta)
                     print(f"[+] Saved capture: {meta['output_file']}  ~{meta['duration_s_est']:.3f}s")
                     recording = False
                     fh = None
@@ -301,14 +528,13 @@ class SoapyLimeScanner:
                     post_left = 0
 
             # dwell timeout
-            if (time.time() - st) >= dwell_s:
+            if time.monotonic() >= deadline:
                 # if still recording, finalize
                 if recording and fh is not None:
-                    fh.close()
+                    self.write_q.put((fh, None))  # writer flushes and closes
                     meta["samples_captured_complex"] = int(wrote_samples)
                     meta["duration_s_est"] = wrote_samples / float(self.args.rate)
-                    with open(out_js, "w") as jf:
-                        json.dump(meta, jf, indent=2)
+                    write_json(out_js, meta)
                     print(f"[+] Saved capture (dwell end): {meta['output_file']}  ~{meta['duration_s_est']:.3f}s")
                     recording = False
                 break
@@ -322,7 +548,7 @@ def main():
     ap.add_argument("--device", default="driver=lime", help='Soapy device string, e.g. "driver=lime"')
     ap.add_argument("--rate", type=float, default=5e6, help="Sample rate (S/s), e.g. 5e6, 10e6")
     ap.add_argument("--bandwidth", type=float, default=0.0, help="Analog filter bandwidth (Hz), 0 to leave default")
-    ap.add_argument("--gain", default="50", help='Overall gain dB or per-stage "LNA,TIA,PGA"')
+    ap.add_argument("--gain", type=parse_gain_string, default="50", help='Overall gain dB or per-stage "LNA,TIA,PGA"')
     ap.add_argument("--antenna", default="LNAW", help="Antenna port (LNAW/LNAH/LNAL). Default LNAW")
     ap.add_argument("--agc", action="store_true", help="Enable AGC")
     ap.add_argument("--dc", action="store_true", help="Enable DC offset correction")
@@ -341,6 +567,9 @@ def main():
     ap.add_argument("--energy-window-s", type=float, default=0.010, help="RMS window length (s)")
     ap.add_argument("--energy-hop-s",    type=float, default=0.005, help="RMS hop length (s)")
     ap.add_argument("--noise-percentile", type=float, default=20.0, help="Percentile for noise floor estimate (robust)")
+    ap.add_argument("--trigger-bw", type=float, default=0.0,
+                    help="Trigger on power within +-bw/2 of center only, via FFT (Hz, e.g. 125e3); 0 = wideband RMS")
+    ap.add_argument("--noise-est-windows", type=int, default=200, help="RMS windows kept for the noise floor estimate")
     ap.add_argument("--trigger-db-over-floor", type=float, default=8.0, help="Trigger when energy exceeds floor + dB")
 
     # Capture shaping
@@ -357,7 +586,9 @@ def main():
     ensure_dir(args.outdir)
     print("[*] Starting EU868 scan with params:")
     for k,v in sorted(vars(args).items()):
-        if k in ("device", "antenna", "gain", "outdir"):
+        if k == "gain":
+            print(f"    {k}: {v['text']}")
+        elif k in ("device", "antenna", "outdir"):
             print(f"    {k}: {v}")
         else:
             print(f"    {k}: {v}")
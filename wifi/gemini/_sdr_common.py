@@ -0,0 +1,60 @@
+# Shared SoapySDR lookup/RX setup for the gemini capture and analysis scripts.
+
+import functools
+
+import SoapySDR
+
+@functools.lru_cache(maxsize=None)
+def _enumerate(args):
+    # device enumeration probes every driver module; do it once per process
+    return tuple(SoapySDR.Device.enumerate(args))
+
+def find_lime(driver="lime"):
+    """
+    Finds the first SoapySDR device for `driver` and opens it.
+
+    Args:
+        driver (str): SoapySDR driver key.
+
+    Returns:
+        SoapySDR.Device or None: The opened device, or None if none was found
+        (the reason has already been printed).
+    """
+    print("Searching for SDR devices...")
+    try:
+        if not hasattr(SoapySDR, 'Device'):
+            raise AttributeError("module 'SoapySDR' has no attribute 'Device'.")
+        results = _enumerate(f"driver={driver}")
+    except AttributeError as e:
+        print(f"Error: {e}")
+        return None
+
+    if not results:
+        print(f"No SoapySDR devices found with driver '{driver}'.")
+        return None
+
+    sdr_info = results[0]
+    print(f"Found SDR device: {sdr_info['label']}")
+    return SoapySDR.Device(sdr_info)
+
+def setup_rx(sdr, sample_rate, center_freq, gain=50, fmt=SoapySDR.SOAPY_SDR_CS16):
+    """
+    Configures RX channel 0 and returns an activated stream.
+
+    Args:
+        sdr (SoapySDR.Device): Device from find_lime().
+        sample_rate (float): Sample rate in Hz.
+        center_freq (float): Center frequency in Hz.
+        gain (float): Overall RX gain in dB.
+        fmt (str): Stream format; native CS16 by default.
+
+    Returns:
+        The active RX stream handle.
+    """
+    sdr.setGain(SoapySDR.SOAPY_SDR_RX, 0, gain)
+    sdr.setSampleRate(SoapySDR.SOAPY_SDR_RX, 0, sample_rate)
+    sdr.setFrequency(SoapySDR.SOAPY_SDR_RX, 0, center_freq)
+
+    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, fmt, [0], {})
+    sdr.activateStream(stream)
+    return stream
@@ -8,6 +8,38 @@ import SoapySDR
 from SoapySDR import * # Import all functions
 import numpy as np
 
+# Optional SciPy for the Welch PSD; falls back to an equivalent numpy version.
+try:
+    from scipy.signal import welch
+    HAVE_SCIPY = True
+except Exception:
+    HAVE_SCIPY = False
+
+# Samples captured per LO position and Welch segment length.
+CAPTURE_LEN = 65536
+NPERSEG = 1024
+
+def psd_welch(x, fs, nperseg=NPERSEG):
+    """Two-sided Welch PSD (power/Hz) of complex samples; returns (offset freqs, Pxx)."""
+    if HAVE_SCIPY:
+        return welch(x, fs=fs, nperseg=nperseg, return_onesided=False, scaling="density")
+    # Hann window, 50% overlap, per-segment mean removed: what scipy does by default.
+    win = np.hanning(nperseg + 1)[:-1].astype(np.float32)
+    segs = np.lib.stride_tricks.sliding_window_view(x, nperseg)[::nperseg // 2]
+    X = np.fft.fft((segs - segs.mean(axis=1, keepdims=True)) * win, axis=1)
+    pxx = (X.real**2 + X.imag**2).mean(axis=0) / (fs * np.sum(win**2))
+    return np.fft.fftfreq(nperseg, 1.0 / fs), pxx
+
+def read_full(sdr, stream, buff):
+    """Fill buff completely; readStream may return fewer samples than requested."""
+    got = 0
+    while got < len(buff):
+        sr = sdr.readStream(stream, [buff[got:]], len(buff) - got, timeoutUs=100000)
+        if sr.ret <= 0:
+            break
+        got += sr.ret
+    return got
+
 def scan_wifi_band(freq_start, freq_end, step_size, sample_rate, gain):
     # Find all LimeSDR devices connected to the system.
     # The "driver=lime" argument specifies we are looking for LimeSDR devices.
@@ -42,29 +74,43 @@ def scan_wifi_band(freq_start, freq_end, step_size, sample_rate, gain):
         
         print("Scanning...")
         
-        # Loop through the frequency range, stepping by the defined size.
-        for freq in np.arange(freq_start, freq_end, step_size):
-            # Tune the SDR to the current frequency in the loop.
-            sdr.setFrequency(SOAPY_SDR_RX, 0, freq)
-            
-            # Create a numpy array to store the IQ samples.
-            rx_buff = np.zeros(1024, dtype=np.complex64)
-            
-            # Read samples from the device into the buffer.
-            # This is a blocking call that will wait until data is available.
-            sr = sdr.readStream(rx_stream, [rx_buff], len(rx_buff), timeoutUs=100000)
-            
-            # This part of the code is for conceptual signal analysis.
-            # We calculate the average power of the signal at the current frequency.
-            # A higher power value indicates a stronger signal at this frequency.
-            avg_power = np.mean(np.abs(rx_buff)**2)
-            
-            # Convert power to dB for a more meaningful scale.
-            power_db = 10 * np.log10(avg_power) if avg_power > 0 else -100
-            
-            # Print the frequency and its corresponding signal power.
-            print(f"Frequency: {freq/1e9:.3f} GHz | Average Power: {power_db:.2f} dB")
-        
+        # One capture covers the whole usable receive bandwidth, so instead of retuning
+        # (and waiting on the PLL) for every step, tune once per usable span and read
+        # the power of every step inside it from a single Welch PSD.
+        # keep clear of the anti-alias filter edges (but always fit at least one step)
+        usable = max(0.8 * sample_rate, step_size)
+        targets = np.arange(freq_start, freq_end, step_size)
+        t = 0
+        # One IQ buffer for every read; np.empty since readStream overwrites it anyway.
+        rx_buff = np.empty(CAPTURE_LEN, dtype=np.complex64)
+        while t < len(targets):
+            # Anchor the span on the first unmeasured step, so its channel (and every
+            # one taken below) sits wholly inside lo +/- usable/2.
+            lo = targets[t] - step_size / 2 + usable / 2
+            # Tune the SDR to the current LO position.
+            sdr.setFrequency(SOAPY_SDR_RX, 0, lo)
+
+            n = read_full(sdr, rx_stream, rx_buff)
+            if n >= NPERSEG:
+                f, pxx = psd_welch(rx_buff[:n], sample_rate)
+            else:
+                print(f"Short read at {lo/1e9:.3f} GHz ({n} samples)")
+                f, pxx = None, None
+            df = sample_rate / NPERSEG
+            # Every step whose channel fits in this span: integrate the PSD over it.
+            while t < len(targets) and targets[t] + step_size / 2 <= lo + usable / 2:
+                avg_power = 0.0
+                if pxx is not None:
+                    band = np.abs(f + lo - targets[t]) <= step_size / 2
+                    avg_power = float(pxx[band].sum()) * df
+
+                # Convert power to dB for a more meaningful scale.
+                power_db = 10 * np.log10(avg_power) if avg_power > 0 else -100
+
+                # Print the frequency and its corresponding signal power.
+                print(f"Frequency: {targets[t]/1e9:.3f} GHz | Average Power: {power_db:.2f} dB")
+                t += 1
+
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
@@ -78,23 +78,27 @@ def listen_for_ssid(ssid):
     sdr.setFrequency(SoapySDR.SOAPY_SDR_RX, 0, CENTER_FREQ)
     
     # Set up the stream
-    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, SoapySDR.SOAPY_SDR_CF32, [0], {})
+    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, SoapySDR.SOAPY_SDR_CS16, [0], {})
     sdr.activateStream(stream)
 
     # Create a buffer for the samples
     buffer_size = 8192  # Must be a power of 2
-    rx_buffer = np.zeros(buffer_size, dtype=np.complex64)
+    # native CS16 off the wire (half the bytes of CF32), scaled to complex64 only for the demod
+    raw_buffer = np.empty(2 * buffer_size, dtype=np.int16)  # overwritten by every readStream
+    rx_buffer = np.empty(buffer_size, dtype=np.complex64)
+    iq_scale = np.float32(1.0 / 32768)
 
     print(f"Listening for SSID: '{ssid}' at {CENTER_FREQ/1e9} GHz...")
 
     try:
         # Loop to continuously read from the SDR
         for _ in range(10):  # Read 10 blocks of samples as an example
-            sr = sdr.readStream(stream, [rx_buffer], buffer_size, timeoutUs=100000)
+            sr = sdr.readStream(stream, [raw_buffer], buffer_size, timeoutUs=100000)
             ret = sr.ret  # Returns the number of samples read or a negative error code
             
             if ret > 0:
                 print(f"Read {ret} samples.")
+                np.multiply(raw_buffer[:2 * ret], iq_scale, out=rx_buffer[:ret].view(np.float32))
                 detected_ssids = demodulate_wifi(rx_buffer[:ret], SAMPLE_RATE)
                 if detected_ssids:
                     print(f"Detected SSID: {detected_ssids}")
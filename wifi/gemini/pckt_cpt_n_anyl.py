@@ -1,10 +1,21 @@
 # Wi-Fi Packet Capture and Analysis with SoapySDR and Scapy
 
-import time
+import functools
+import mmap
+import os
+import queue
+import re
+import threading
 import numpy as np
-import SoapySDR
-import struct
-from scapy.all import Ether, Dot11, RadioTap, Raw, hexdump
+from _sdr_common import find_lime, setup_rx
+from scapy.all import Dot11, hexdump
+
+# Optional Hyperscan (compiled multi-pattern DFA); falls back to one re alternation
+try:
+    import hyperscan
+    HAVE_HYPERSCAN = True
+except Exception:
+    HAVE_HYPERSCAN = False
 
 # --- User-defined parameters ---
 SAMPLE_RATE = 10e6  # Hz
@@ -12,61 +23,167 @@ CENTER_FREQ = 2.412e9  # Hz (This is Wi-Fi Channel 1)
 SSID_TO_FIND = "your_ssid_here"
 CAPTURE_FILE = "wifi_capture.bin"
 CAPTURE_DURATION_SECONDS = 5
+MAX_PACKETS = 20  # matches handed to Scapy per file
+
+# 802.11 management frame starts (frame control, zero duration, broadcast DA) worth
+# handing to Scapy; everything else in the stream is skipped by the scanner.
+DOT11_SIGNATURES = (
+    ("beacon",       rb"\x80\x00\x00\x00\xff\xff\xff\xff\xff\xff"),
+    ("probe-req",    rb"\x40\x00\x00\x00\xff\xff\xff\xff\xff\xff"),
+    ("deauth-bcast", rb"\xc0\x00\x00\x00\xff\xff\xff\xff\xff\xff"),
+)
+DOT11_MAX_LEN = 2346  # max 802.11 MPDU; upper bound of the slice given to Scapy
+_DOT11_RE = re.compile(b"|".join(b"(" + pat + b")" for _, pat in DOT11_SIGNATURES))
 
 def capture_wifi_data(duration_seconds):
     """
-    Captures raw IQ data from the SDR and saves it to a file.
+    Captures raw IQ data (CS16, interleaved int16 I/Q) from the SDR and saves it to a file.
 
     Args:
         duration_seconds (int): The duration of the capture in seconds.
     """
-    print("Searching for SDR devices...")
-    try:
-        if not hasattr(SoapySDR, 'Device'):
-            raise AttributeError("module 'SoapySDR' has no attribute 'Device'.")
-        results = SoapySDR.Device.enumerate("driver=lime")
-    except AttributeError as e:
-        print(f"Error: {e}")
+    sdr = find_lime()
+    if sdr is None:
         return
-
-    if not results:
-        print("No SoapySDR devices found with driver 'lime'.")
-        return
-
-    sdr_info = results[0]
-    print(f"Found SDR device: {sdr_info['label']}")
-
-    sdr = SoapySDR.Device(sdr_info)
-    sdr.setGain(SoapySDR.SOAPY_SDR_RX, 0, 50)
-    sdr.setSampleRate(SoapySDR.SOAPY_SDR_RX, 0, SAMPLE_RATE)
-    sdr.setFrequency(SoapySDR.SOAPY_SDR_RX, 0, CENTER_FREQ)
-    
-    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, SoapySDR.SOAPY_SDR_CF32, [0], {})
-    sdr.activateStream(stream)
+    stream = setup_rx(sdr, SAMPLE_RATE, CENTER_FREQ)
 
     buffer_size = 8192
-    rx_buffer = np.zeros(buffer_size, dtype=np.complex64)
+    # native CS16: interleaved int16 I/Q, half the bytes of CF32 and no conversion.
+    # A pool of page-aligned (anonymous mmap) buffers: readStream fills one while a
+    # writer thread hands the filled ones to the kernel with os.writev, gathering up to
+    # ~1 MiB per syscall; no tobytes()/stdio copies.
+    bytes_per_buffer = buffer_size * 4
+    gather = max(1, (1 << 20) // bytes_per_buffer)
+    maps = [mmap.mmap(-1, bytes_per_buffer) for _ in range(2 * gather)]
+    bufs = [np.frombuffer(m, dtype=np.int16) for m in maps]
+    views = [memoryview(m) for m in maps]
+    free_q, full_q = queue.Queue(), queue.Queue()
+    for i in range(len(bufs)): free_q.put(i)
+    write_err = []
     num_samples_to_capture = int(SAMPLE_RATE * duration_seconds)
     total_samples_captured = 0
 
     print(f"Starting {duration_seconds} second capture to '{CAPTURE_FILE}'...")
-    
-    with open(CAPTURE_FILE, "wb") as f:
-        while total_samples_captured < num_samples_to_capture:
-            sr = sdr.readStream(stream, [rx_buffer], buffer_size, timeoutUs=1000000)
+
+    fd = os.open(CAPTURE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    # pure sequential sink: tell the kernel, and drop written-back pages as we go so a
+    # multi-GB capture doesn't evict the rest of the page cache
+    fadvise = hasattr(os, "posix_fadvise")
+    if fadvise:
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            fadvise = False
+    drop_every = 64 << 20
+
+    def write_all(mvs):
+        n = os.writev(fd, mvs)
+        for mv in mvs:
+            if n >= len(mv):
+                n -= len(mv)
+                continue
+            mv = mv[n:]
+            n = 0
+            while mv:
+                mv = mv[os.write(fd, mv):]
+
+    def writer():
+        written = dropped = 0
+        done = False
+        while not done:
+            items = [full_q.get()]
+            # gather whatever else is already queued, up to ~1 MiB per writev
+            while len(items) < gather and items[-1] is not None:
+                try:
+                    items.append(full_q.get_nowait())
+                except queue.Empty:
+                    break
+            if items[-1] is None:
+                done = True
+                items.pop()
+            if not items:
+                continue
+            try:
+                mvs = [views[i][:count * 4] for i, count in items]
+                write_all(mvs)
+                written += sum(len(mv) for mv in mvs)
+                if fadvise and written - dropped >= drop_every:
+                    # clean pages are evicted; still-dirty ones are left for writeback
+                    os.posix_fadvise(fd, dropped, written - dropped, os.POSIX_FADV_DONTNEED)
+                    dropped = written
+            except OSError as e:
+                write_err.append(e)
+                return
+            finally:
+                for i, _ in items:
+                    free_q.put(i)
+
+    wt = threading.Thread(target=writer, daemon=True)
+    wt.start()
+
+    try:
+        while total_samples_captured < num_samples_to_capture and not write_err:
+            i = free_q.get()
+            sr = sdr.readStream(stream, [bufs[i]], buffer_size, timeoutUs=1000000)
             ret = sr.ret
             if ret > 0:
-                # Write the raw bytes of the complex samples to the file
-                f.write(rx_buffer[:ret].tobytes())
+                # Queue the raw int16 I/Q bytes for the writer
+                full_q.put((i, ret))
                 total_samples_captured += ret
             else:
+                free_q.put(i)
                 print(f"Error reading stream: {ret}")
                 break
+    finally:
+        full_q.put(None)
+        wt.join()
+        if fadvise:
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+        os.close(fd)
+    if write_err:
+        print(f"Write error: {write_err[0]}")
 
     sdr.deactivateStream(stream)
     sdr.closeStream(stream)
     print(f"Capture finished. Saved {total_samples_captured} samples.")
 
+@functools.lru_cache(maxsize=None)
+def _hs_database():
+    # compiling the DFA is the expensive part; do it once per process
+    db = hyperscan.Database()
+    db.compile(expressions=[pat for _, pat in DOT11_SIGNATURES],
+               ids=list(range(len(DOT11_SIGNATURES))),
+               elements=len(DOT11_SIGNATURES),
+               flags=[hyperscan.HS_FLAG_SOM_LEFTMOST] * len(DOT11_SIGNATURES))
+    return db
+
+def find_dot11_frames(buf, limit=MAX_PACKETS):
+    """
+    Scans a bytes-like buffer once for DOT11_SIGNATURES.
+
+    Returns a list of (offset, name) for at most `limit` matches, in file order.
+    """
+    hits = []
+    if HAVE_HYPERSCAN:
+        def on_match(pat_id, start, end, flags, context):
+            hits.append((start, DOT11_SIGNATURES[pat_id][0]))
+            return len(hits) >= limit  # non-zero stops the scan
+
+        try:
+            _hs_database().scan(buf, match_event_handler=on_match)
+        except hyperscan.ScanTerminated:
+            pass  # on_match hit `limit`
+        hits.sort()
+        return hits
+    for m in _DOT11_RE.finditer(buf):
+        hits.append((m.start(), DOT11_SIGNATURES[m.lastindex - 1][0]))
+        if len(hits) >= limit:
+            break
+    return hits
+
 def parse_wifi_packets_from_file(filepath):
     """
     Attempts to parse raw bytes from a file as Wi-Fi packets using Scapy.
@@ -76,7 +193,11 @@ def parse_wifi_packets_from_file(filepath):
     """
     try:
         with open(filepath, "rb") as f:
-            raw_data = f.read()
+            if os.fstat(f.fileno()).st_size == 0:
+                print(f"Error: The file '{filepath}' is empty.")
+                return
+            # mapped, not read: the scanner walks the page cache directly
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
         # NOTE: This is a conceptual step. Directly parsing raw IQ samples as a
         # Wi-Fi packet is not possible. A real-world solution requires a
@@ -87,30 +208,31 @@ def parse_wifi_packets_from_file(filepath):
         print(f"\nAttempting to parse '{filepath}' with Scapy...")
         
         # In a real scenario, you would be feeding a stream of demodulated bytes.
-        # This is a placeholder to show the syntax.
-        # Here we're just trying to parse a small chunk of the file
-        # which will likely not align with a packet boundary.
-        
-        # Let's take a small chunk of the raw data to "pretend" it's a packet
-        # This is for demonstration purposes only.
-        chunk = raw_data[1000:2000]
-
+        # Instead of parsing blindly, the whole file is scanned once for 802.11
+        # frame-start signatures and only those offsets are handed to Scapy.
         try:
-            # We first try to parse it with the RadioTap header, common for Wi-Fi.
-            # Then Dot11 is the IEEE 802.11 Wi-Fi protocol layer.
-            packet = RadioTap(chunk)
-            
-            # Print a summary of the decoded packet
-            print("\n--- Scapy Packet Summary ---")
-            packet.summary()
-            
-            print("\n--- Packet Hex Dump ---")
-            hexdump(packet)
-
-        except Exception as e:
-            print(f"Scapy failed to parse the data. This is expected as the data is raw IQ samples, not a demodulated packet stream.")
-            print(f"Error: {e}")
-            print("\nTo do this properly, you need a demodulator that outputs a stream of 802.11 frames, which Scapy can then analyze.")
+            hits = find_dot11_frames(mm)
+            if not hits:
+                print("No 802.11 frame signatures found. This is expected as the data is raw IQ samples, not a demodulated packet stream.")
+                print("\nTo do this properly, you need a demodulator that outputs a stream of 802.11 frames, which Scapy can then analyze.")
+                return
+
+            for off, name in hits:
+                try:
+                    # Dot11 is the IEEE 802.11 Wi-Fi protocol layer.
+                    packet = Dot11(mm[off:off + DOT11_MAX_LEN])
+                except Exception as e:
+                    print(f"Scapy failed to parse the {name} match at offset {off}: {e}")
+                    continue
+
+                # Print a summary of the decoded packet
+                print(f"\n--- Scapy Packet Summary ({name} @ {off}) ---")
+                print(packet.summary())
+                
+                print("\n--- Packet Hex Dump ---")
+                hexdump(packet)
+        finally:
+            mm.close()
 
     except FileNotFoundError:
         print(f"Error: The file '{filepath}' was not found.")
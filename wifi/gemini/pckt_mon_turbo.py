@@ -5,32 +5,96 @@
 # module, a compatible SDR (like the LimeSDR), and a CUDA-enabled GPU with CuPy installed.
 # It is not a standalone executable and is for educational purposes only.
 
-import gnuradio
-import SoapySDR
-from gnuradio import gr, blocks, analog
-from gnuradio.filter import firdes
+import itertools
+import threading
+import time
+
+import numpy as np
+from gnuradio import gr, blocks
 from gnuradio.digital import ofdm_demod
-from gr_ieee802_11 import ieee802_11, sync_long, parse_mac
+from gr_ieee802_11 import sync_long, parse_mac
 from gnuradio.soapy import soapy_source
 
-import cupy as cp
+# CuPy is imported on first GPU use, so the flowgraph starts (and runs) without CUDA
+cp = None
+cufft = None
+
+def _load_cupy():
+    global cp, cufft
+    if cp is None:
+        import cupy
+        from cupy.cuda import cufft as _cufft
+        # cuFFT plans are expensive to create; keep CuPy's own cache big enough for the sizes we use
+        cupy.fft.config.get_plan_cache().set_size(16)
+        cp, cufft = cupy, _cufft
+    return cp
+
+# Round-robin pool of non-blocking streams, each slot with its own persistent cuFFT plan
+# and device buffers (a plan's work area must not be shared by concurrent launches).
+FFT_POOL_SIZE = 4
+_fft_streams = []
+_fft_slots = {}
+_fft_next = itertools.count()
+_fft_lock = threading.Lock()
+
+def pinned_empty(n, dtype=np.complex64):
+    """Page-locked host array, so set()/get() against the GPU can run asynchronously."""
+    _load_cupy()
+    dtype = np.dtype(dtype)
+    mem = cp.cuda.alloc_pinned_memory(n * dtype.itemsize)
+    return np.frombuffer(mem, dtype=dtype, count=n)
+
+def _fft_slot(n):
+    _load_cupy()
+    k = next(_fft_next) % FFT_POOL_SIZE
+    with _fft_lock:
+        if not _fft_streams:
+            _fft_streams.extend(cp.cuda.Stream(non_blocking=True) for _ in range(FFT_POOL_SIZE))
+        slot = _fft_slots.get((n, k))
+        if slot is None:
+            stream = _fft_streams[k]
+            with stream:
+                plan = cufft.Plan1d(n, cufft.CUFFT_C2C, 1)
+                d_in = cp.empty(n, dtype=cp.complex64)
+                d_out = cp.empty(n, dtype=cp.complex64)
+            slot = _fft_slots[(n, k)] = (threading.Lock(), stream, plan, d_in, d_out)
+    return slot
 
 # We will use CuPy for any custom signal processing we want to do.
 # For example, a simple GPU-accelerated filter or FFT.
-def cupy_custom_process(iq_samples):
+def cupy_custom_process(iq_samples, out=None):
     """
-    This function demonstrates a placeholder for GPU-accelerated signal
-    processing using CuPy.
-    
+    GPU FFT of a block of complex IQ samples on a persistent cuFFT plan.
+
+    Calls rotate over FFT_POOL_SIZE streams, so concurrent callers (e.g. several
+    flowgraph threads) overlap their H2D copy, FFT and D2H copy.
+
     Args:
-        iq_samples (cp.ndarray): A CuPy array of complex IQ samples.
-    
+        iq_samples (np.ndarray or cp.ndarray): complex64 IQ samples. Host arrays
+            should come from pinned_empty() so the copies are truly asynchronous.
+        out (np.ndarray, optional): host array (ideally pinned) receiving the
+            spectrum when iq_samples is on the host; allocated if omitted.
+
     Returns:
-        cp.ndarray: The processed CuPy array.
+        cp.ndarray or np.ndarray: The spectrum, on the same side as the input.
     """
-    # Example: A simple element-wise operation on the GPU.
-    processed_samples = cp.fft.fft(iq_samples)
-    return processed_samples
+    _load_cupy()
+    n = iq_samples.shape[0]
+    lock, stream, plan, d_in, d_out = _fft_slot(n)
+    with lock, stream:
+        if isinstance(iq_samples, cp.ndarray):
+            d_in[...] = iq_samples
+            plan.fft(d_in, d_out, cufft.CUFFT_FORWARD)
+            result = d_out.copy()
+            stream.synchronize()
+            return result
+        d_in.set(iq_samples, stream=stream)
+        plan.fft(d_in, d_out, cufft.CUFFT_FORWARD)
+        if out is None:
+            out = pinned_empty(n)
+        d_out.get(out=out, stream=stream)
+        stream.synchronize()
+        return out
 
 class WifiPacketMonitor(gr.top_block):
     """
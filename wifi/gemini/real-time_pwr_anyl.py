@@ -1,74 +1,137 @@
-# Real-time signal analysis with SoapySDR and numpy FFT
+# Real-time signal analysis with SoapySDR (average power via Parseval's theorem)
 
+import math
 import time
 import numpy as np
-import SoapySDR
-import struct
+from _sdr_common import find_lime, setup_rx
+
+def pow_to_db(p, floor_db=-100.0):
+    # scalar dB via math.log10 on a Python float: the EMA is converted once per print,
+    # so a plain libm call beats numpy's scalar dispatch and needs no approximation
+    return 10.0 * math.log10(p) if p > 0 else floor_db
 
 # --- User-defined parameters ---
 SAMPLE_RATE = 20e6  # Hz (Must be higher than the bandwidth of the signal you want to analyze)
 CENTER_FREQ = 2.412e9  # Hz (Wi-Fi Channel 1)
+USE_GPU = False  # CuPy path; an 8192-sample reduction is launch-latency bound, it pays off with much larger buffers
 
-def listen_and_analyze():
-    """
-    Listens for Wi-Fi signals using the SDR, performs a real-time FFT, and
-    analyzes the signal's power.
-    """
-    print("Searching for SDR devices...")
+# Optional CuPy (GPU reduction); imported only when USE_GPU is set (loading it is slow)
+HAVE_CUPY = False
+if USE_GPU:
     try:
-        if not hasattr(SoapySDR, 'Device'):
-            raise AttributeError("module 'SoapySDR' has no attribute 'Device'.")
-        results = SoapySDR.Device.enumerate("driver=lime")
-    except AttributeError as e:
-        print(f"Error: {e}")
-        return
+        import cupy as cp
+        HAVE_CUPY = True
+    except Exception:
+        pass
 
-    if not results:
-        print("No SoapySDR devices found with driver 'lime'.")
-        return
+class GpuAvgPower:
+    """Double-buffered CuPy mean bin power (time-domain sum of |x|^2, see Parseval).
+
+    SDR reads (CS16) land in one of two pinned host buffers; submit() queues the H2D
+    copy, int16 -> float32 conversion and reduction for that buffer on a
+    non-blocking stream and returns the previous buffer's result (None on the first
+    call), so the next readStream overlaps the GPU work. Results therefore lag by one read.
+    """
+    def __init__(self, n):
+        self.stream = cp.cuda.Stream(non_blocking=True)
+        self._pinned = [cp.cuda.alloc_pinned_memory(n * 4) for _ in range(2)]
+        self.host = [np.frombuffer(m, dtype=np.int16, count=2 * n) for m in self._pinned]
+        self.dev = [cp.empty(2 * n, dtype=cp.int16) for _ in range(2)]
+        self.done = [cp.cuda.Event(), cp.cuda.Event()]
+        self.result = [None, None]
+        self.slot = 0
 
-    sdr_info = results[0]
-    print(f"Found SDR device: {sdr_info['label']}")
+    def buffer(self):
+        return self.host[self.slot]
 
-    # Open the device and configure it
-    sdr = SoapySDR.Device(sdr_info)
-    sdr.setGain(SoapySDR.SOAPY_SDR_RX, 0, 50)
-    sdr.setSampleRate(SoapySDR.SOAPY_SDR_RX, 0, SAMPLE_RATE)
-    sdr.setFrequency(SoapySDR.SOAPY_SDR_RX, 0, CENTER_FREQ)
-    
-    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, SoapySDR.SOAPY_SDR_CF32, [0], {})
-    sdr.activateStream(stream)
+    def submit(self):
+        i = self.slot
+        with self.stream:
+            self.dev[i].set(self.host[i], stream=self.stream)
+            x = self.dev[i].astype(cp.float32)
+            x *= 1.0 / 32768
+            self.result[i] = cp.vdot(x, x)
+            self.done[i].record(self.stream)
+        self.slot ^= 1
+        prev = self.slot
+        if self.result[prev] is None:
+            return None
+        self.done[prev].synchronize()
+        out = float(self.result[prev].get())
+        self.result[prev] = None
+        return out
+
+def listen_and_analyze():
+    """
+    Listens for Wi-Fi signals using the SDR and tracks the signal's average
+    spectral power (computed in the time domain, see Parseval's theorem).
+    """
+    sdr = find_lime()
+    if sdr is None:
+        return
+    stream = setup_rx(sdr, SAMPLE_RATE, CENTER_FREQ)
 
     buffer_size = 8192
-    rx_buffer = np.zeros(buffer_size, dtype=np.complex64)
+    batch_size = 16  # reads per batch on the CPU path
+    # the SDR delivers native CS16 (half the bytes of CF32); rows are scaled to float32
+    # in one pass once the batch is full
+    raw = np.empty((batch_size, 2 * buffer_size), dtype=np.int16)
+    batch = np.empty((batch_size, 2 * buffer_size), dtype=np.float32)
+    iq_scale = np.float32(1.0 / 32768)
+    gpu = GpuAvgPower(buffer_size) if (USE_GPU and HAVE_CUPY) else None
+    row = 0
+    # every buffer is consumed; the display is an EMA of per-buffer power printed every 0.5 s
+    ema = None
+    alpha = 0.05
+    print_every = 0.5
+    last_print = time.monotonic()
+    # K EMA steps over a batch in one dot: ema' = (1-a)^K * ema + sum_i a(1-a)^(K-1-i) * p_i
+    ema_w = (alpha * (1 - alpha) ** np.arange(batch_size - 1, -1, -1)).astype(np.float32)
+    ema_decay = (1 - alpha) ** batch_size
 
     print(f"Listening on {CENTER_FREQ/1e9} GHz...")
 
     try:
         while True:
+            rx_buffer = gpu.buffer() if gpu is not None else raw[row]
             sr = sdr.readStream(stream, [rx_buffer], buffer_size, timeoutUs=100000)
             ret = sr.ret
             
             if ret > 0:
-                # --- This is the core signal processing step! ---
-                # 1. Take the received IQ samples and perform a Fast Fourier Transform.
-                #    The FFT shifts the signal from the time domain to the frequency domain.
-                fft_result = np.fft.fft(rx_buffer)
-
-                # 2. Calculate the power of each frequency component.
-                #    We square the absolute value of the FFT result to get the power.
-                power = np.abs(fft_result)**2
-                
-                # 3. Calculate the average power of the entire received signal.
-                #    This gives us a single value to monitor.
-                avg_power = np.mean(power)
+                if gpu is not None:
+                    # 1-3. Power reduction on the GPU; the scalar comes back one read late.
+                    avg_power = gpu.submit()
+                    if avg_power is None:
+                        continue
+                    ema = avg_power if ema is None else (1 - alpha) * ema + alpha * avg_power
+                else:
+                    # keep reading until all K rows of the batch are filled
+                    row += 1
+                    if row < batch_size:
+                        continue
+                    row = 0
+                    np.multiply(raw, iq_scale, out=batch)
+
+                    # --- This is the core signal processing step! ---
+                    # 1-3. The average bin power of an unnormalised N-point FFT is
+                    #    mean|X[k]|^2 = sum|x[n]|^2 (Parseval), so no FFT is needed for it:
+                    #    each buffer's power is a dot product of its interleaved I/Q with itself.
+                    #    These fold, in read order, into a moving average to monitor.
+                    batch_power = np.einsum("ij,ij->i", batch, batch)
+                    if ema is None:
+                        ema = float(batch_power[0])
+                    ema = ema_decay * ema + float(ema_w @ batch_power)
+
+                now = time.monotonic()
+                if now - last_print < print_every:
+                    continue
+                last_print = now
 
                 # 4. Convert the average power to a decibel (dB) scale for easier reading.
                 #    The dB scale is logarithmic and more intuitive for signal strength.
-                power_db = 10 * np.log10(avg_power) if avg_power > 0 else -100
+                power_db = pow_to_db(float(ema))
                 
                 print(f"Average Signal Power: {power_db:.2f} dB")
-                time.sleep(0.5)
 
             else:
                 print(f"Error reading stream: {ret}")
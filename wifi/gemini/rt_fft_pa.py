@@ -1,86 +1,279 @@
 # Real-time FFT power analysis to find the strongest signal in a band.
 
+import math
+import os
+import queue
+import threading
 import time
 import numpy as np
-import SoapySDR
-import struct
+from _sdr_common import find_lime, setup_rx
+
+# Optional FFTW (planned, SIMD FFT); falls back to numpy.fft
+try:
+    import pyfftw
+    HAVE_FFTW = True
+except Exception:
+    HAVE_FFTW = False
+
+# Optional Numba: fuses |X|^2 + argmax into one pass; falls back to numpy
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except Exception:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def argmax_mag2(F):
+        # argmax of |F|^2 over a flat complex array in one pass: no power array, only the
+        # running max. Returns the (unshifted) flat index and its power.
+        best = -1.0
+        idx = 0
+        for k in range(F.size):
+            re = F[k].real
+            im = F[k].imag
+            p = re * re + im * im
+            if p > best:
+                best = p
+                idx = k
+        return idx, best
+
+def pow_to_db(p, floor_db=-100.0):
+    # scalar dB via math.log10 on a Python float: the EMA is converted once per print,
+    # so a plain libm call beats numpy's scalar dispatch and needs no approximation
+    return 10.0 * math.log10(p) if p > 0 else floor_db
+
+def load_wisdom(path):
+    # True if any FFTW wisdom was imported; a missing or stale file just means replanning.
+    # The file holds export_wisdom()'s (double, single, long double) strings, NUL-separated.
+    try:
+        with open(path, "rb") as f:
+            parts = tuple(f.read().split(b"\0"))
+        if len(parts) != 3:
+            return False
+        return any(pyfftw.import_wisdom(parts))
+    except (OSError, TypeError, ValueError):
+        return False
+
+def save_wisdom(path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"\0".join(pyfftw.export_wisdom()))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not save FFTW wisdom to '{path}': {e}")
+
+def plan_fft(a, out):
+    """
+    Batched forward FFT plan over axis 1, specialised for this machine.
+
+    The first run plans with FFTW_MEASURE and persists the wisdom to FFTW_WISDOM;
+    later runs import it and plan with FFTW_WISDOM_ONLY, so the cached plan is used
+    as-is and startup does no measuring. Plans overwrite `a` (FFTW_DESTROY_INPUT).
+    """
+    kw = dict(axes=(1,), direction="FFTW_FORWARD", threads=os.cpu_count() or 1)
+    if load_wisdom(FFTW_WISDOM):
+        try:
+            return pyfftw.FFTW(a, out, flags=("FFTW_MEASURE", "FFTW_WISDOM_ONLY", "FFTW_DESTROY_INPUT"), **kw)
+        except RuntimeError:
+            pass  # no wisdom for this shape/alignment/thread count yet
+    print("Planning FFT (FFTW_MEASURE, one-time for this machine)...")
+    plan = pyfftw.FFTW(a, out, flags=("FFTW_MEASURE", "FFTW_DESTROY_INPUT"), **kw)
+    save_wisdom(FFTW_WISDOM)
+    return plan
 
 # --- User-defined parameters ---
 SAMPLE_RATE = 20e6  # Hz (Must be higher than the bandwidth of the signal you want to analyze)
 CENTER_FREQ = 2.44e9  # Hz (This is a good spot to check for multiple Wi-Fi channels)
+USE_GPU = False  # CuPy path; an 8192-pt FFT is launch-latency bound, it pays off with much larger buffers
+FFTW_WISDOM = os.path.expanduser("~/.cache/wifi_fftw_wisdom")  # per-machine plans, reused across runs
+
+# Optional CuPy (GPU FFT + reduction); imported only when USE_GPU is set (loading it is slow)
+HAVE_CUPY = False
+if USE_GPU:
+    try:
+        import cupy as cp
+        HAVE_CUPY = True
+    except Exception:
+        pass
+
+class GpuPeak:
+    """Double-buffered CuPy FFT + shifted-spectrum peak search.
+
+    SDR reads (CS16) land in one of two pinned host buffers; submit() queues the H2D
+    copy, int16 -> complex64 conversion, FFT and reduction for that buffer on a
+    non-blocking stream and returns the previous buffer's result (None on the first
+    call), so the next readStream overlaps the GPU work. Results therefore lag by one read.
+    """
+    def __init__(self, n):
+        self.stream = cp.cuda.Stream(non_blocking=True)
+        self._pinned = [cp.cuda.alloc_pinned_memory(n * 4) for _ in range(2)]
+        self.host = [np.frombuffer(m, dtype=np.int16, count=2 * n) for m in self._pinned]
+        self.dev = [cp.empty(2 * n, dtype=cp.int16) for _ in range(2)]
+        self.done = [cp.cuda.Event(), cp.cuda.Event()]
+        self.result = [None, None]
+        self.slot = 0
+
+    def buffer(self):
+        return self.host[self.slot]
+
+    def submit(self):
+        i = self.slot
+        with self.stream:
+            self.dev[i].set(self.host[i], stream=self.stream)
+            x = self.dev[i].astype(cp.float32)
+            x *= 1.0 / 32768
+            F = cp.fft.fft(x.view(cp.complex64))
+            p = F.real * F.real + F.imag * F.imag
+            k = cp.argmax(p)
+            self.result[i] = (k, p[k])
+            self.done[i].record(self.stream)
+        self.slot ^= 1
+        prev = self.slot
+        if self.result[prev] is None:
+            return None
+        self.done[prev].synchronize()
+        k, best = self.result[prev]
+        n = self.host[prev].size // 2
+        out = ((int(k.get()) + n // 2) % n, float(best.get()))
+        self.result[prev] = None
+        return out
 
 def find_strongest_signal():
     """
     Listens for Wi-Fi signals using the SDR, performs a real-time FFT, and
     analyzes the signal's power.
     """
-    print("Searching for SDR devices...")
-    try:
-        if not hasattr(SoapySDR, 'Device'):
-            raise AttributeError("module 'SoapySDR' has no attribute 'Device'.")
-        results = SoapySDR.Device.enumerate("driver=lime")
-    except AttributeError as e:
-        print(f"Error: {e}")
+    sdr = find_lime()
+    if sdr is None:
         return
+    stream = setup_rx(sdr, SAMPLE_RATE, CENTER_FREQ)
 
-    if not results:
-        print("No SoapySDR devices found with driver 'lime'.")
-        return
-
-    sdr_info = results[0]
-    print(f"Found SDR device: {sdr_info['label']}")
+    buffer_size = 8192
+    batch_size = 16  # reads per FFT batch on the CPU path
+    if HAVE_FFTW:
+        # reads are converted into the rows of the plan's aligned (K, N) input; the plan
+        # is built once (from saved wisdom when available) and does all K transforms per execute
+        batch = pyfftw.empty_aligned((batch_size, buffer_size), dtype=np.complex64, n=64)
+        fft_out = pyfftw.empty_aligned((batch_size, buffer_size), dtype=np.complex64, n=64)
+        fft_plan = plan_fft(batch, fft_out)
+        batch[:] = 0
+    else:
+        batch = np.zeros((batch_size, buffer_size), dtype=np.complex64)
+        fft_plan = None
+    # the SDR delivers native CS16 (half the bytes of CF32). On the CPU path a reader
+    # thread fills whole (K, 2N) int16 batches, double-buffered, while this thread scales,
+    # transforms and reduces the previous one; readStream, the FFTW execute and the
+    # Numba kernel all run without the GIL, so capture and compute overlap.
+    raw = np.empty((2, batch_size, 2 * buffer_size), dtype=np.int16)
+    iq_scale = np.float32(1.0 / 32768)
+    free_q, full_q = queue.Queue(), queue.Queue()
+    for i in range(len(raw)): free_q.put(i)
+    stop = threading.Event()
+    gpu = GpuPeak(buffer_size) if (USE_GPU and HAVE_CUPY) else None
+    if not HAVE_NUMBA:
+        # per-bin power scratch for the numpy path, reused every batch
+        power_spectrum = np.empty((batch_size, buffer_size), dtype=np.float32)
+    # every buffer is consumed; the display is the latest peak frequency with an EMA of
+    # its power, printed every 0.5 s
+    ema = None
+    alpha = 0.05
+    print_every = 0.5
+    last_print = time.monotonic()
 
-    # Open the device and configure it
-    sdr = SoapySDR.Device(sdr_info)
-    sdr.setGain(SoapySDR.SOAPY_SDR_RX, 0, 50)
-    sdr.setSampleRate(SoapySDR.SOAPY_SDR_RX, 0, SAMPLE_RATE)
-    sdr.setFrequency(SoapySDR.SOAPY_SDR_RX, 0, CENTER_FREQ)
-    
-    stream = sdr.setupStream(SoapySDR.SOAPY_SDR_RX, SoapySDR.SOAPY_SDR_CF32, [0], {})
-    sdr.activateStream(stream)
+    def reader():
+        while not stop.is_set():
+            try:
+                i = free_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            row = 0
+            while row < batch_size and not stop.is_set():
+                sr = sdr.readStream(stream, [raw[i, row]], buffer_size, timeoutUs=100000)
+                if sr.ret > 0:
+                    row += 1
+                else:
+                    print(f"Error reading stream: {sr.ret}")
+            if row == batch_size:
+                full_q.put(i)
+            else:
+                free_q.put(i)
 
-    buffer_size = 8192
-    rx_buffer = np.zeros(buffer_size, dtype=np.complex64)
+    rx_thread = None
+    if gpu is None:
+        rx_thread = threading.Thread(target=reader, daemon=True)
+        rx_thread.start()
 
     print(f"Listening on {CENTER_FREQ/1e9} GHz...")
 
     try:
         while True:
-            sr = sdr.readStream(stream, [rx_buffer], buffer_size, timeoutUs=100000)
-            ret = sr.ret
-            
-            if ret > 0:
-                # 1. Take the received IQ samples and perform a Fast Fourier Transform.
-                fft_result = np.fft.fft(rx_buffer)
-
-                # 2. Shift the zero-frequency component to the center of the array.
-                #    This makes the visualization and analysis more intuitive.
-                fft_shifted = np.fft.fftshift(fft_result)
-
-                # 3. Calculate the power of each frequency component.
-                power_spectrum = np.abs(fft_shifted)**2
-                
-                # 4. Find the frequency bin with the maximum power.
-                max_power_idx = np.argmax(power_spectrum)
-
-                # 5. Calculate the corresponding frequency in Hz.
-                #    The frequency step is SAMPLE_RATE / buffer_size.
-                freq_step = SAMPLE_RATE / buffer_size
-                strongest_freq_offset = (max_power_idx - buffer_size / 2) * freq_step
-                strongest_freq = CENTER_FREQ + strongest_freq_offset
-                
-                # 6. Convert the power to a decibel (dB) scale for easier reading.
-                max_power_db = 10 * np.log10(power_spectrum[max_power_idx]) if power_spectrum[max_power_idx] > 0 else -100
-                
-                print(f"Strongest Signal: {strongest_freq/1e9:.4f} GHz | Power: {max_power_db:.2f} dB")
-                time.sleep(0.5)
+            if gpu is not None:
+                sr = sdr.readStream(stream, [gpu.buffer()], buffer_size, timeoutUs=100000)
+                ret = sr.ret
+                if ret <= 0:
+                    print(f"Error reading stream: {ret}")
+                    continue
 
+                # 1-4. FFT and peak search on the GPU; the result comes back one read late.
+                peak = gpu.submit()
+                if peak is None:
+                    continue
+                max_power_idx, max_power = peak
             else:
-                print(f"Error reading stream: {ret}")
+                # a full batch of K reads from the reader thread; its buffer goes straight
+                # back once scaled into the FFT input
+                i = full_q.get()
+                np.multiply(raw[i], iq_scale, out=batch.view(np.float32))
+                free_q.put(i)
+
+                # 1. Take the received IQ samples and perform a Fast Fourier Transform.
+                #    One batched call transforms every read in the batch.
+                fft_result = fft_plan() if fft_plan is not None else np.fft.fft(batch, axis=1)
+
+                if HAVE_NUMBA:
+                    # 2-3. Power and peak search in a single pass over the FFT output.
+                    flat_idx, max_power = argmax_mag2(fft_result.reshape(-1))
+                else:
+                    # 2. Calculate the power of each frequency component (unshifted order).
+                    #    The FFT output is read as contiguous (..., 2) re/im float pairs
+                    #    and reduced in one pass, rather than via strided .real/.imag views.
+                    pairs = fft_result.view(fft_result.real.dtype).reshape(batch_size, buffer_size, 2)
+                    np.einsum("ijk,ijk->ij", pairs, pairs, out=power_spectrum, casting="same_kind")
+
+                    # 3. Find the frequency bin with the maximum power anywhere in the batch.
+                    flat_idx = int(np.argmax(power_spectrum))
+                    max_power = power_spectrum.flat[flat_idx]
+
+                # 4. Map it to its fftshift-ed position instead of shifting the whole array.
+                raw_idx = flat_idx % buffer_size
+                max_power_idx = (raw_idx + buffer_size // 2) % buffer_size
+
+            ema = max_power if ema is None else (1 - alpha) * ema + alpha * max_power
+            now = time.monotonic()
+            if now - last_print < print_every:
+                continue
+            last_print = now
+
+            # 5. Calculate the corresponding frequency in Hz.
+            #    The frequency step is SAMPLE_RATE / buffer_size.
+            freq_step = SAMPLE_RATE / buffer_size
+            strongest_freq_offset = (max_power_idx - buffer_size / 2) * freq_step
+            strongest_freq = CENTER_FREQ + strongest_freq_offset
+            
+            # 6. Convert the power to a decibel (dB) scale for easier reading.
+            max_power_db = pow_to_db(float(ema))
+            
+            print(f"Strongest Signal: {strongest_freq/1e9:.4f} GHz | Power: {max_power_db:.2f} dB")
 
     except KeyboardInterrupt:
         print("\nStopping listener.")
     finally:
+        stop.set()
+        if rx_thread is not None:
+            rx_thread.join()
         # Clean up the stream and close the device
         sdr.deactivateStream(stream)
         sdr.closeStream(stream)
@@ -22,6 +22,15 @@ def pick_center(freq_hz: float, band: int, channel: int):
         return WIFI24_CENTER_HZ[channel]
     raise SystemExit("Specify --freq or a valid --band 24 --channel {1..13}")
 
+def page_aligned(shape, dtype, align: int = 4096) -> np.ndarray:
+    """Uninitialised array starting on a page boundary, so USB drivers can DMA
+    straight from it instead of through a bounce buffer."""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    off = (-raw.ctypes.data) % align
+    return raw[off:off+nbytes].view(dtype).reshape(shape)
+
 def setup_sdr(center, rate, bw, gain, driver, tx_path, pad=None, iamp=None, antenna=None):
     sdr = SoapySDR.Device(dict(driver=driver))
     ch = 0
@@ -104,8 +113,21 @@ def main():
     tone = float(args.tone_hz)
     n = 4096  # buffer size per write
     t = np.arange(n, dtype=np.float32) / rate
-    ph = 2 * math.pi * tone * t
-    wave = (args.amplitude * (np.cos(ph) + 1j*np.sin(ph))).astype(np.complex64)
+    ph = np.float32(2 * math.pi * tone) * t
+    # one complex exp per sample straight into a complex64 buffer (no separate cos/sin
+    # passes, no complex128 temporary)
+    wave = np.empty(n, dtype=np.complex64)
+    np.exp(1j * ph, out=wave)
+    wave *= np.float32(args.amplitude)
+
+    # Page-aligned copies of the table, written round-robin so a buffer the driver may
+    # still hold from an earlier submission is never the next one handed over; the
+    # [buf] argument lists are built once instead of per writeStream call.
+    tx_bufs = [page_aligned(n, np.complex64) for _ in range(4)]
+    for b in tx_bufs:
+        b[:] = wave
+    tx_lists = [[b] for b in tx_bufs]
+    k = 0
 
     sdr, st, ch = setup_sdr(center, rate, args.bw, args.gain, args.driver, args.tx_path,
                             pad=args.pad, iamp=args.iamp, antenna=args.antenna)
@@ -121,7 +143,8 @@ def main():
     t_end = time.time() + float(args.seconds)
     try:
         while not stop and time.time() < t_end:
-            sr = sdr.writeStream(st, [wave], len(wave))
+            sr = sdr.writeStream(st, tx_lists[k], n)
+            k = (k + 1) & 3
             if hasattr(sr, "ret"):
                 if sr.ret <= 0:
                     continue
@@ -1,12 +1,23 @@
 #!/usr/bin/env python3
-import argparse, csv, time
+import argparse, csv, functools, math, time
 from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CF32
 
+from _fft_common import HAVE_SCIPY, HAVE_FFTW, HAVE_NUMBA, sfft, njit, prange, fftw_plan
+
 WIFI24 = {ch: 2.412e9 + (ch-1)*5e6 for ch in range(1,14)}  # ch1..13
+BLOCK = 512  # dwell frames per batched FFT; bounds the frame matrix to BLOCK*nfft*8 bytes
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _psd_db(Xre, Xim, out, norm):
+        """out[i] = 10*log10(|X[i]|^2 * norm + 1e-12) in a single pass, no temporaries."""
+        for i in prange(out.shape[0]):
+            s = Xre[i]*Xre[i] + Xim[i]*Xim[i]
+            out[i] = 10.0*math.log10(s*norm + 1e-12)
 
 def open_rx(rate, bw, gain, driver, lna_path, lna, tia, pga, antenna, center):
     sdr = SoapySDR.Device(dict(driver=driver))
@@ -41,11 +52,38 @@ def read_stream_compat(sdr, st, view, want, timeout_us=1_000_000):
     try: return int(res),0
     except Exception: return 0,0
 
-def psd_frame(iq, nfft):
-    win = np.hanning(nfft).astype(np.float32)
-    X = np.fft.fftshift(np.fft.fft(iq*win, n=nfft))
-    pxx = (np.abs(X)**2) / (nfft + 1e-12)
-    return 10.0*np.log10(pxx + 1e-12).astype(np.float32)
+@functools.lru_cache(maxsize=8)
+def hann32(nfft):
+    """float32 Hann window, built once per size and shared, hence read-only."""
+    w = np.hanning(nfft).astype(np.float32)
+    w.flags.writeable = False
+    return w
+
+def psd_frames(frames, nfft, out):
+    """dBFS spectra of the (rows, nfft) frames in one batched FFT, written into
+    `out` (float32, same shape). Bins are left unshifted; the caller shifts the
+    reduced spectrum once."""
+    win = hann32(nfft)
+    if HAVE_FFTW:
+        plan, a, X = fftw_plan(frames.shape[0], nfft)
+        np.multiply(frames, win, out=a)
+        plan()
+    elif HAVE_SCIPY:
+        # complex64 in, complex64 out; the windowed temporary is ours to overwrite
+        X = sfft.fft(frames*win, axis=-1, overwrite_x=True, workers=-1)
+    else:
+        X = np.fft.fft(frames*win, axis=-1)
+    if HAVE_NUMBA:
+        _psd_db(X.real.reshape(-1), X.imag.reshape(-1), out.reshape(-1), 1.0/(nfft + 1e-12))
+        return out
+    # |X|^2 = re^2 + im^2 straight into out (float32), then dB in place
+    pairs = X.view(X.real.dtype).reshape(X.shape + (2,))
+    np.einsum("ijk,ijk->ij", pairs, pairs, out=out, casting="same_kind")
+    out *= 1.0/(nfft + 1e-12)
+    out += 1e-12
+    np.log10(out, out=out)
+    out *= 10.0
+    return out
 
 def bins_for_range(center_hz, span_hz, nfft, f0, f1):
     bin_bw = span_hz/nfft
@@ -83,20 +121,29 @@ def sweep(args):
         sdr, st, idx = open_rx(args.rate, args.bw, args.gain, args.driver,
                                args.lna_path, args.lna, args.tia, args.pga,
                                args.antenna, cf)
-        buf = np.empty(nfft, dtype=np.complex64)
+        block = min(dwell_frames, BLOCK)
+        frames = np.empty((block, nfft), dtype=np.complex64)
+        pbuf = np.empty((block, nfft), dtype=np.float32)  # per-frame dBFS, reused
         acc = None
-        row = 0
-        while row < dwell_frames:
-            nread,_ = read_stream_compat(sdr, st, buf, nfft)
-            if nread <= 0: continue
-            if nread < nfft:
-                tmp = np.zeros(nfft, dtype=np.complex64); tmp[:nread] = buf[:nread]
-                p = psd_frame(tmp, nfft)
+        left = dwell_frames
+        while left > 0:
+            n = min(block, left)
+            row = 0
+            while row < n:
+                nread,_ = read_stream_compat(sdr, st, frames[row], nfft)
+                if nread <= 0: continue
+                if nread < nfft: frames[row, nread:] = 0
+                row += 1
+            p = psd_frames(frames[:n], nfft, pbuf[:n])
+            # acc = 0.9*acc + 0.1*p over the block, unrolled into one weighted sum
+            w = 0.1 * np.power(np.float32(0.9), np.arange(n-1, -1, -1, dtype=np.float32))
+            if acc is None:
+                w[0] = 0.9**(n-1)  # first frame seeds the EMA
+                acc = w @ p
             else:
-                p = psd_frame(buf, nfft)
-            p = apply_mutes(p, cf, args.rate, nfft, mute_ranges)
-            acc = p if acc is None else (0.9*acc + 0.1*p)
-            row += 1
+                acc = 0.9**n * acc + w @ p
+            left -= n
+        acc = apply_mutes(np.fft.fftshift(acc), cf, args.rate, nfft, mute_ranges)
         try:
             sdr.deactivateStream(st); sdr.closeStream(st)
         except Exception: pass
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 import argparse
+import functools
 import json
+import math
 import time
 from pathlib import Path
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import SoapySDR
 from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CF32
 
+from _fft_common import HAVE_SCIPY, HAVE_FFTW, HAVE_NUMBA, sfft, njit, prange, fftw_plan
+
 import matplotlib
 matplotlib.use("TkAgg")  # or "Qt5Agg" if you prefer; change if needed
 import matplotlib.pyplot as plt
@@ -15,27 +20,55 @@ from matplotlib.animation import FuncAnimation
 VERSION = "wifi_live_fft.py v1.0"
 LIME_MAX_HZ = 3.8e9  # LimeSDR Mini v2 practical upper limit
 
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _dbfs(x, out):
+        """out[i] = 10*log10(max(x[i], 1e-12)) in a single pass."""
+        for i in prange(out.shape[0]):
+            v = x[i]
+            out[i] = 10.0*math.log10(v if v > 1e-12 else 1e-12)
+
 def dbfs(x):
+    if HAVE_NUMBA:
+        out = np.empty(x.shape[0], dtype=np.float32)
+        _dbfs(x, out)
+        return out
     return 10.0 * np.log10(np.maximum(x, 1e-12))
 
-def welch_psd(iq, nfft=4096, overlap=0.5, window="hann"):
-    """Welch PSD (linear). No self-norm to 0 dB."""
-    iq = np.asarray(iq)
+@functools.lru_cache(maxsize=8)
+def welch_window(nfft, window="hann"):
+    """float32 analysis window and its power sum(w^2), built once per (size, kind).
+    The window is shared between calls, hence read-only."""
     if window == "hann":
         win = np.hanning(nfft).astype(np.float32)
     else:
         win = np.ones(nfft, dtype=np.float32)
+    win.flags.writeable = False
+    return win, float((win.astype(np.float64)**2).sum())
+
+def welch_psd(iq, nfft=4096, overlap=0.5, window="hann"):
+    """Welch PSD (linear). No self-norm to 0 dB."""
+    iq = np.asarray(iq)
+    win, wpow = welch_window(nfft, window)
     step = max(1, int(nfft * (1.0 - overlap)))
-    segs = []
-    wpow = (win**2).sum()
-    for i in range(0, len(iq) - nfft + 1, step):
-        seg = iq[i:i+nfft] * win
-        X = np.fft.fftshift(np.fft.fft(seg))
-        pxx = (np.abs(X)**2) / (nfft * wpow + 1e-12)
-        segs.append(pxx)
-    if not segs:
+    if len(iq) < nfft:
         return None
-    return np.mean(np.stack(segs, axis=0), axis=0)
+    # all overlapping segments as a strided (nseg, nfft) view, one batched FFT
+    frames = sliding_window_view(iq, nfft)[::step]
+    if HAVE_FFTW:
+        plan, a, X = fftw_plan(frames.shape[0], nfft)
+        np.multiply(frames, win, out=a)
+        plan()
+    elif HAVE_SCIPY:
+        X = sfft.fft(frames * win, axis=-1, overwrite_x=True, workers=-1)
+    else:
+        X = np.fft.fft(frames * win, axis=-1)
+    # sum re^2 + im^2 over segments in one pass (no |X| temporaries), then
+    # average and shift once instead of once per segment
+    pairs = X.view(X.real.dtype).reshape(X.shape + (2,))
+    pxx = np.einsum("ijk,ijk->j", pairs, pairs)
+    pxx /= X.shape[0] * (nfft * wpow + 1e-12)
+    return np.fft.fftshift(pxx)
 
 def set_lime_gains(sdr, ch, overall, lna=None, tia=None, pga=None):
     try:
@@ -96,12 +129,6 @@ def _read_stream_compat(sdr, st, view, want, timeout_us=500000):
     except Exception:
         return 0, 0
 
-def ringpush(img, row):
-    """Push a new row (1D) into a 2D image (scroll up)."""
-    img[:-1, :] = img[1:, :]
-    img[-1, :] = row
-    return img
-
 def load_channels_json(path):
     with open(path, "r", encoding="utf-8") as f:
         j = json.load(f)
@@ -159,7 +186,11 @@ def main():
     block = max(args.fft * 4, 262144)  # capture a chunk per frame
     iq = np.empty(block, dtype=np.complex64)
     avg_spec = None  # EMA of dBFS spectrum
-    wf = np.full((args.wf_rows, args.fft), -120.0, dtype=np.float32)
+    # waterfall ring stored twice (mirrored) so the time-ordered window
+    # wf_buf[wf_head:wf_head+wf_rows] is always a contiguous view, never a copy
+    wf_rows = args.wf_rows
+    wf_buf = np.full((2*wf_rows, args.fft), -120.0, dtype=np.float32)
+    wf_head = 0
 
     # Matplotlib set-up
     fig = plt.figure(figsize=(10, 7))
@@ -170,15 +201,21 @@ def main():
     ax0.set_xlim(0, args.fft-1)
     ax0.set_ylim(-100, -40)
     ax0.set_ylabel("Power (dBFS)")
-    title = ax0.set_title(f"{('2.4GHz' if args.band=='24' else '5GHz')} ch{args.channel} @ {cf/1e6:.3f} MHz")
+    # status text lives inside ax0 so the blit background restore covers it
+    title = ax0.text(0.01, 0.97, f"{('2.4GHz' if args.band=='24' else '5GHz')} ch{args.channel} @ {cf/1e6:.3f} MHz",
+                     transform=ax0.transAxes, va="top")
 
     ax1 = fig.add_subplot(gs[1, 0])
-    im = ax1.imshow(wf, origin="lower", aspect="auto", vmin=-100, vmax=-40, interpolation="nearest")
+    im = ax1.imshow(wf_buf[:wf_rows], origin="lower", aspect="auto", vmin=-100, vmax=-40, interpolation="nearest")
     cbar = fig.colorbar(im, ax=ax1, pad=0.01)
     cbar.set_label("dBFS")
     ax1.set_ylabel("Time")
     ax1.set_xlabel("FFT bin")
 
+    # only these change per frame; blitting redraws them over a cached background
+    for artist in (spec_line, im, title):
+        artist.set_animated(True)
+
     # Key bindings
     state = {"running": True, "gain": args.gain, "avg": args.avg, "center": cf}
 
@@ -240,18 +277,18 @@ def main():
         return iq[:got]
 
     def update(_frame):
-        nonlocal avg_spec, wf
+        nonlocal avg_spec, wf_head
         if not state["running"]:
             plt.close(fig)
-            return
+            return spec_line, im, title
 
         data = grab_block()
         if data.size < args.fft:
-            return
+            return spec_line, im, title
 
         pxx = welch_psd(data, nfft=args.fft, overlap=args.overlap)
         if pxx is None:
-            return
+            return spec_line, im, title
         spec_db = dbfs(pxx)
 
         if avg_spec is None:
@@ -261,13 +298,15 @@ def main():
             avg_spec = alpha * avg_spec + (1.0 - alpha) * spec_db
 
         spec_line.set_ydata(avg_spec)
-        wf = ringpush(wf, avg_spec.astype(np.float32))
-        im.set_data(wf)
+        wf_buf[wf_head] = avg_spec
+        wf_buf[wf_head + wf_rows] = avg_spec
+        wf_head = (wf_head + 1) % wf_rows
+        im.set_data(wf_buf[wf_head:wf_head + wf_rows])
         title.set_text(f"{('2.4GHz' if args.band=='24' else '5GHz')} ch{args.channel} @ {state['center']/1e6:.3f} MHz  "
                        f"gain {state['gain']:.1f} dB  avg {state['avg']:.2f}")
         return spec_line, im, title
 
-    ani = FuncAnimation(fig, update, interval=60, blit=False)
+    ani = FuncAnimation(fig, update, interval=60, blit=True)
     try:
         plt.show()
     finally: